@@ -217,6 +217,45 @@ ROLEPERMISSIONS_MODULE = 'CTAFramework.roles'
 ROLEPERMISSIONS_REDIRECT_TO_LOGIN = True
 
 CTA_MAN_COMMAND = 'man -L en'
+# Render the local man pages in-process, the man command is used just for the pages it can not render.
+# Its text is not the same than "man | col -b" (e.g. no header and footer), so the fingerprints and the
+# corpus of a source change when it is switched
+CTA_MAN_NATIVE_READER = False
+# Processes used to fetch and parse man pages on extracts
+CTA_EXTRACT_WORKERS = os.cpu_count() or 1
+# Get all the remote man pages of an extract with one ssh pipeline
+CTA_SSH_HARVEST = True
+CTA_SSH_HARVEST_TIMEOUT = 600
+# Seconds an idle ssh connection of run_on_server is kept for the next run on the same host
+CTA_SSH_POOL_IDLE_TIMEOUT = 300
+# Idle ssh connections kept per host, port and user
+CTA_SSH_POOL_MAX_IDLE = 2
+# Send the files of a run on server and get its results as one tar stream, for latency bound links
+CTA_WORKSPACE_ARCHIVE = False
+# Keyword resources listed in the manifest of a server profile, the least recently used are removed
+CTA_RESOURCE_CACHE_SIZE = 500
+# Commands written per transaction on extracts
+CTA_EXTRACT_BATCH_SIZE = 500
+# Seconds between the progress updates of an extract task
+CTA_EXTRACT_PROGRESS_INTERVAL = 2
+# Commands per celery subtask on remote extracts, 0 runs every extract in a single task
+CTA_EXTRACT_SHARD_SIZE = 500
+# Hosts harvested at the same time by an extract of several hosts
+CTA_EXTRACT_HOST_CONCURRENCY = 8
+# Seconds a user regular expression of a Product extract can take with the sample man pages
+CTA_REGEX_CHECK_BUDGET = 5
+# Man pages of the corpus of the Product used as sample to check its regular expression
+CTA_REGEX_SAMPLE_PAGES = 50
+# Seconds to parse a man page with a user regular expression, slower pages are skipped
+CTA_REGEX_PAGE_TIMEOUT = 10
+# Days the checkpoint of an extract that never finished is kept
+CTA_CHECKPOINT_MAX_AGE = 7
+# Raw man pages of every extract are kept to parse them again without the host
+CTA_CORPUS = True
+CTA_CORPUS_ROOT = os.path.join(MEDIA_ROOT, "corpus")
+# Corpora not updated in CTA_CORPUS_MAX_AGE days are deleted, then the oldest ones over the size limit
+CTA_CORPUS_MAX_AGE = 90
+CTA_CORPUS_MAX_SIZE = 2 * 1024 * 1024 * 1024
 
 try:
     from .localsettings import *
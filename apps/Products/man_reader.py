@@ -0,0 +1,749 @@
+import bz2
+import gzip
+import lzma
+import os
+import posixpath
+import re
+import subprocess
+import tarfile
+import textwrap
+
+# Same search order than man-db when no section is given
+SECTIONS_ORDER = ['1', 'n', 'l', '8', '3', '0', '2', '5', '4', '9', '6', '7']
+DEFAULT_MANPATH = ['/usr/local/share/man', '/usr/share/man', '/usr/local/man', '/usr/man']
+OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+}
+
+DECOMPRESSORS = {
+    '.gz': gzip.decompress,
+    '.bz2': bz2.decompress,
+    '.xz': lzma.decompress,
+    '.lzma': lzma.decompress,
+}
+# Sections of the pages of an archive when the commands are not known
+COMMAND_SECTIONS = ('1', 'n', 'l', '8', '6')
+# Directories of translated pages, like "de", "pt_BR" or "sr@latin"
+LANGUAGE_DIRECTORY_RE = re.compile(r'^[a-z]{2}(_[A-Z]{2})?([.@].+)?$')
+OVERSTRIKE_RE = re.compile(r'.\x08')
+
+# Width used by man on a non interactive output
+LINE_WIDTH = 78
+# Default indentation of the text, sub headers and paragraphs
+BASE_INDENT = 7
+SUBSECTION_INDENT = 3
+
+ESCAPE_RE = re.compile(
+    r"\\(?:"
+    r"f(?:\[[^\]]*\]|\(..|.)"  # fonts
+    r"|s[+-]?(?:\[[^\]]*\]|\(..|\d\d?|'[^']*')"  # sizes
+    r"|[nmgF](?:\[[^\]]*\]|\(..|.)"  # registers, colors and families
+    r"|[hvwlLoDbXxNRZz]'[^']*'"  # motions and drawing
+    r"|k."
+    r"|\*(?:\[[^\]]*\]|\(..|.)"  # strings
+    r"|\[[^\]]*\]|\(.."  # special characters
+    r"|."
+    r")"
+)
+CHARACTERS = {
+    'em': '—', 'en': '–', 'hy': '-', 'mi': '-', 'bu': '•', 'ci': 'o', 'sq': '□',
+    'aq': "'", 'dq': '"', 'lq': '“', 'rq': '”', 'oq': '‘', 'cq': '’', 'Fo': '«', 'Fc': '»',
+    'co': '©', 'rg': '®', 'tm': '™', 'de': '°', 'mu': '×', 'di': '÷', '+-': '±', 'pl': '+',
+    '->': '→', '<-': '←', '<=': '≤', '>=': '≥', '!=': '≠', '==': '≡', 'ti': '~', 'ha': '^',
+    'rs': '\\', 'sl': '/', 'ba': '|', 'or': '|', 'at': '@', 'sh': '#', 'Do': '$', 'lB': '[',
+    'rB': ']', 'lC': '{', 'rC': '}', 'la': '⟨', 'ra': '⟩', 'ga': '`', 'aa': '´', 'ul': '_',
+}
+STRINGS = {'R': '®', 'Tm': '™', 'lq': '“', 'rq': '”'}
+ESCAPES = {
+    '-': '-', 'e': '\\', '\\': '\\', ' ': ' ', '~': ' ', '0': ' ', '`': '`', "'": '´', '.': '.',
+    't': '\t',
+}
+FONT_MACROS = ('B', 'I', 'SM', 'SB')
+ALTERNATING_MACROS = ('BR', 'BI', 'IB', 'RB', 'RI', 'IR')
+PARAGRAPH_MACROS = ('PP', 'LP', 'P', 'HP')
+# Macros of mdoc(7) pages, those ones are left to man
+MDOC_MACROS = ('Dd', 'Sh')
+
+
+class ManReader:
+    """
+    In-process man page reader, finds the source of a man page under the MANPATH, decompress
+    it and renders the man(7) macros to plain text laid out like "man | col -b", without its
+    header and footer lines.
+
+    The directories of the MANPATH are listed once, so a reader is meant to be long-lived
+    """
+
+    def __init__(self, manpath=None, language='en'):
+        """
+        __init__(self, manpath=None, language='en')
+
+        <manpath> is a list of directories, by default the one of the MANPATH variable or
+        the manpath command. Pages of <language> have preference over the untranslated ones
+        """
+        self.manpath = manpath if manpath is not None else self._get_manpath()
+        self.language = language
+        self.index = None
+
+    @staticmethod
+    def _get_manpath():
+        """
+        _get_manpath() -> list of directories
+        """
+        manpath = os.environ.get('MANPATH', '')
+        if not manpath.strip(':'):
+            try:
+                manpath = subprocess.run(['manpath', '-q'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         universal_newlines=True, timeout=10).stdout.strip()
+            except Exception:
+                manpath = ''
+        directories = [directory for directory in manpath.split(':') if directory]
+        return directories or DEFAULT_MANPATH
+
+    def _build_index(self):
+        """
+        _build_index(self)
+
+        Map every page name to the path of its source, keeping the first one found in the
+        order of the MANPATH, language and SECTIONS_ORDER
+        """
+        self.index = dict()
+        ranks = dict()
+        for (root_rank, root) in enumerate(self.manpath):
+            roots = [root]
+            if self.language:
+                roots.insert(0, os.path.join(root, self.language))
+            for (language_rank, base) in enumerate(roots):
+                try:
+                    entries = os.listdir(base)
+                except OSError:
+                    continue
+                for entry in entries:
+                    if not entry.startswith('man') or len(entry) < 4:
+                        continue
+                    section = entry[3:]
+                    try:
+                        section_rank = SECTIONS_ORDER.index(section[0])
+                    except ValueError:
+                        section_rank = len(SECTIONS_ORDER)
+                    directory = os.path.join(base, entry)
+                    try:
+                        pages = os.listdir(directory)
+                    except OSError:
+                        continue
+                    for page in pages:
+                        name = self._page_name(page, section)
+                        if name is None:
+                            continue
+                        rank = (root_rank, language_rank, section_rank, section != name_section(page, name))
+                        if name not in ranks or rank < ranks[name]:
+                            ranks[name] = rank
+                            self.index[name] = os.path.join(directory, page)
+
+    @staticmethod
+    def _page_name(page, section):
+        """
+        _page_name(page, section) -> name of the command | None
+
+        "ls.1.gz" and "openssl-req.1ssl.gz" in man1 are "ls" and "openssl-req"
+        """
+        for suffix in OPENERS:
+            if page.endswith(suffix):
+                page = page[:-len(suffix)]
+                break
+        name, dot, page_section = page.rpartition('.')
+        if not dot or not name or not page_section.startswith(section[0]):
+            return None
+        return name
+
+    def find(self, command):
+        """
+        find(self, command) -> path of the man page source | None
+        """
+        if self.index is None:
+            self._build_index()
+        return self.index.get(command)
+
+    def count(self):
+        """
+        count(self) -> number of man pages found in the MANPATH
+        """
+        if self.index is None:
+            self._build_index()
+        return len(self.index)
+
+    @staticmethod
+    def read_source(path):
+        """
+        read_source(path) -> text of a gzip, bz2, xz or plain man page source
+        """
+        opener = OPENERS.get(os.path.splitext(path)[1], open)
+        with opener(path, 'rt', encoding='utf-8', errors='replace') as source:
+            return source.read()
+
+    def _resolve(self, path, text, depth=0):
+        """
+        _resolve(self, path, text, depth=0) -> text
+
+        Follow the ".so" links of a page, they are relative to the root of its manpath
+        """
+        lines = text.split('\n')
+        for (position, line) in enumerate(lines):
+            if not line.startswith('.so ') or depth > 5:
+                continue
+            target = line[4:].strip()
+            root = os.path.dirname(os.path.dirname(path))
+            candidates = [os.path.join(root, target)] + [os.path.join(root, target + suffix) for suffix in OPENERS]
+            for candidate in candidates:
+                if os.path.isfile(candidate):
+                    lines[position] = self._resolve(candidate, self.read_source(candidate), depth + 1)
+                    break
+            else:
+                lines[position] = ''
+        return '\n'.join(lines)
+
+    def read(self, path):
+        """
+        read(self, path) -> man page text | None
+
+        Render the source in <path>, None when it can not be rendered in-process (mdoc
+        pages), in that case the man command is needed
+        """
+        return render(self._resolve(path, self.read_source(path)))
+
+    def get(self, command):
+        """
+        get(self, command) -> man page text | None
+        """
+        path = self.find(command)
+        if path is None:
+            return None
+        return self.read(path)
+
+
+class ArchiveReader:
+    """
+    Man page reader of a tar archive of a man directory (e.g. /usr/share/man), copied from a
+    host without connection. The archive is read as a stream, without unpacking it, and the
+    pages are rendered as soon as they are read.
+
+    The compressed sources of the pages are kept in memory until the end of the archive, so
+    the links and the names whose best page was not the first one found are resolved
+    """
+
+    def __init__(self, path, commands=None, width=LINE_WIDTH):
+        """
+        __init__(self, path, commands=None, width=LINE_WIDTH)
+
+        <path> is a tar archive, plain or compressed. Without <commands>, the list of
+        commands of the host, the pages of the COMMAND_SECTIONS are read
+        """
+        self.path = path
+        self.commands = set(commands) if commands is not None else None
+        self.width = width
+        self.sources = dict()
+        self.links = dict()
+
+    def pages(self):
+        """
+        pages(self) -> generator of (command, man page text | None)
+        """
+        for (name, source) in self.sources_of_pages():
+            yield name, render_source(source, width=self.width) if source is not None else None
+
+    def sources_of_pages(self):
+        """
+        sources_of_pages(self) -> generator of (command, man page source | None)
+
+        The pages of section 1 are yielded while the archive is read, the rest of them when
+        it ends, as every name is taken from its first page in SECTIONS_ORDER. The sources
+        have their ".so" links resolved, so they can be rendered in another process. The
+        <commands> without a page are yielded with None
+        """
+        candidates = dict()
+        done = set()
+        with tarfile.open(self.path, 'r|*') as archive:
+            for member in archive:
+                page = archive_page(member.name)
+                if page is None:
+                    continue
+                path, root, name, rank = page
+                # Every page is kept, any of them can be the target of a link
+                if member.issym() or member.islnk():
+                    self.links[path] = self._link_target(member, root)
+                elif member.isfile():
+                    self.sources[path] = archive.extractfile(member).read()
+                else:
+                    continue
+                if name in done:
+                    continue
+                if self.commands is not None and name not in self.commands:
+                    continue
+                if self.commands is None and rank[0] >= len(COMMAND_SECTIONS):
+                    continue
+                if rank == (0, False) and path in self.sources:
+                    text = self._source(path)
+                    if '\n.so ' not in '\n' + text:
+                        done.add(name)
+                        yield name, text
+                        continue
+                if name not in candidates or rank < candidates[name][0]:
+                    candidates[name] = (rank, path, root)
+        for (name, (rank, path, root)) in sorted(candidates.items()):
+            if name in done:
+                continue
+            text = self._source(path)
+            if text is None:
+                continue
+            done.add(name)
+            yield name, self._resolve(root, text)
+        for command in sorted((self.commands or set()) - done):
+            yield command, None
+
+    def _link_target(self, member, root):
+        """
+        _link_target(self, member, root) -> path in the archive
+
+        Hard links name a member of the archive, symbolic links are relative to their
+        directory or an absolute path of the host, taken as relative to the manpath <root>
+        """
+        if member.islnk():
+            return _normalize(member.linkname)
+        if member.linkname.startswith('/'):
+            return _normalize(posixpath.join(root, *member.linkname.split('/')[-2:]))
+        return _normalize(posixpath.join(posixpath.dirname(member.name), member.linkname))
+
+    def _source(self, path, depth=0):
+        """
+        _source(self, path, depth=0) -> text of the source of <path> | None
+
+        Follow the links of the archive and decompress the source
+        """
+        while path in self.links and depth < 5:
+            path = self.links[path]
+            depth += 1
+        data = self.sources.get(path)
+        if data is None:
+            return None
+        decompress = DECOMPRESSORS.get(posixpath.splitext(path)[1])
+        try:
+            if decompress is not None:
+                data = decompress(data)
+        except (OSError, EOFError, lzma.LZMAError):
+            return None
+        return data.decode('utf-8', errors='replace')
+
+    def _resolve(self, root, text, depth=0):
+        """
+        _resolve(self, root, text, depth=0) -> text
+
+        Follow the ".so" links of a page, they are relative to its manpath <root>
+        """
+        lines = text.split('\n')
+        for (position, line) in enumerate(lines):
+            if not line.startswith('.so ') or depth > 5:
+                continue
+            target = _normalize(posixpath.join(root, line[4:].strip()))
+            lines[position] = ''
+            for candidate in [target] + [target + suffix for suffix in DECOMPRESSORS]:
+                source = self._source(candidate)
+                if source is not None:
+                    lines[position] = self._resolve(root, source, depth + 1)
+                    break
+        return '\n'.join(lines)
+
+
+
+def archive_page(member_name):
+    """
+    archive_page(member_name) -> (path, root, name, rank) | None
+
+    "./usr/share/man/man1/ls.1.gz" is ("usr/share/man/man1/ls.1.gz", "usr/share/man", "ls",
+    (0, False)), where rank is the order of the section and whether the file name has other
+    section. None for the translated pages and the rest of files
+    """
+    path = _normalize(member_name)
+    parts = path.split('/')
+    if len(parts) < 2 or not parts[-2].startswith('man') or len(parts[-2]) < 4:
+        return None
+    root = '/'.join(parts[:-2])
+    if parts[:-2] and LANGUAGE_DIRECTORY_RE.match(parts[-3]):
+        return None
+    section = parts[-2][3:]
+    name = ManReader._page_name(parts[-1], section)
+    if name is None:
+        return None
+    # Sections of commands go first, then the rest in the order of SECTIONS_ORDER
+    if section[0] in COMMAND_SECTIONS:
+        section_rank = COMMAND_SECTIONS.index(section[0])
+    elif section[0] in SECTIONS_ORDER:
+        section_rank = len(COMMAND_SECTIONS) + SECTIONS_ORDER.index(section[0])
+    else:
+        section_rank = len(COMMAND_SECTIONS) + len(SECTIONS_ORDER)
+    return path, root, name, (section_rank, section != name_section(parts[-1], name))
+
+
+def _normalize(path):
+    """
+    _normalize(path) -> path of an archive member without "./" or a leading "/"
+    """
+    path = posixpath.normpath(path)
+    return path.lstrip('/') if path != '.' else ''
+
+
+def render_source(source, width=LINE_WIDTH):
+    """
+    render_source(source, width=LINE_WIDTH) -> plain text | None
+
+    Render a man page <source> in-process or, for mdoc pages, with render_with_man
+    """
+    man = render(source, width=width)
+    if man is None:
+        man = render_with_man(source, width=width)
+    return man
+
+
+def render_with_man(source, width=LINE_WIDTH):
+    """
+    render_with_man(source, width=LINE_WIDTH) -> plain text | None
+
+    Render a <source> that render does not support (mdoc pages) with the man command of
+    the local host, None when it is not installed
+    """
+    try:
+        result = subprocess.run(['man', '-l', '-'], input=source, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True,
+                                env=dict(os.environ, MANWIDTH=str(width)))
+    except OSError:
+        return None
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return OVERSTRIKE_RE.sub('', result.stdout)
+
+
+def name_section(page, name):
+    """
+    name_section(page, name) -> section written in the file name of a <page>
+    """
+    return page[len(name) + 1:].split('.')[0]
+
+
+def _escape(match, strings):
+    """
+    _escape(match, strings) -> text of a roff escape sequence
+    """
+    escape = match.group()[1:]
+    kind = escape[0]
+    if kind in ESCAPES and len(escape) == 1:
+        return ESCAPES[kind]
+    if kind == '(':
+        return CHARACTERS.get(escape[1:], '')
+    if kind == '[':
+        name = escape[1:-1]
+        if name.startswith('u') and len(name) > 1:
+            try:
+                return chr(int(name[1:].split('_')[0], 16))
+            except ValueError:
+                return ''
+        return CHARACTERS.get(name, '')
+    if kind == '*':
+        name = escape[1:]
+        if name[0] == '(':
+            name = name[1:]
+        elif name[0] == '[':
+            name = name[1:-1]
+        return strings.get(name, '')
+    return ''
+
+
+def render(source, width=LINE_WIDTH):
+    """
+    render(source, width=LINE_WIDTH) -> plain text | None
+
+    Render a man(7) <source> with a layout close to "man | col -b": section headers at the first
+    column, text filled and indented, tagged paragraphs with the tag on its own line when it
+    does not fit in the indentation. It is not the same text, there is no header or footer and
+    the lines are not hyphenated or justified. Returns None for mdoc(7) pages
+    """
+    return _Renderer(width).render(source)
+
+
+class _Renderer:
+    def __init__(self, width):
+        self.width = width
+        self.output = []
+        self.words = []
+        self.strings = dict(STRINGS)
+        self.fill = True
+        self.indent = BASE_INDENT
+        self.base_indent = BASE_INDENT
+        self.relative_indents = []
+        self.hanging = None
+        self.tag_pending = False
+        self.conditions = []
+        self.in_table = False
+        self.table_format = False
+        self.at_header = False
+
+    def text(self, line):
+        """
+        text(self, line) -> line without roff escapes
+        """
+        if '\\' not in line:
+            return line
+        line = line.split('\\"')[0]
+        return ESCAPE_RE.sub(lambda match: _escape(match, self.strings), line)
+
+    def write(self, line):
+        self.output.append(line.rstrip())
+        self.at_header = False
+
+    def blank(self):
+        self.flush()
+        # Paragraphs just after a header do not start with a blank line
+        if self.output and self.output[-1] != '' and not self.at_header:
+            self.output.append('')
+
+    def flush(self):
+        """
+        flush(self)
+
+        Write the filled words with the current indentation
+        """
+        if not self.words:
+            return
+        text = ' '.join(self.words)
+        self.words = []
+        indent = ' ' * self.indent
+        if self.hanging is not None:
+            tag, tag_indent = self.hanging
+            self.hanging = None
+            first = ' ' * tag_indent + tag
+            if len(first) < self.indent:
+                # The tag fits, the text starts at the same line
+                lines = textwrap.wrap(text, self.width, initial_indent=first.ljust(self.indent),
+                                      subsequent_indent=indent, break_on_hyphens=False,
+                                      break_long_words=False) or [first]
+                for line in lines:
+                    self.write(line)
+                return
+            self.write(first)
+        lines = textwrap.wrap(text, self.width, initial_indent=indent, subsequent_indent=indent,
+                              break_on_hyphens=False, break_long_words=False)
+        for line in lines:
+            self.write(line)
+
+    def flush_tag(self):
+        if self.hanging is not None and not self.words:
+            tag, tag_indent = self.hanging
+            self.hanging = None
+            self.write(' ' * tag_indent + tag)
+
+    def add_text(self, text):
+        if self.tag_pending:
+            self.tag_pending = False
+            self.hanging = (text.strip(), self.base_indent)
+            return
+        if not self.fill:
+            self.flush_tag()
+            self.write(' ' * self.indent + text)
+            return
+        if not text.strip():
+            self.blank()
+            return
+        if text[0] == ' ':
+            self.flush()
+            self.flush_tag()
+        self.words.extend(text.split())
+
+    def paragraph(self, indent=None):
+        self.blank()
+        self.hanging = None
+        self.indent = self.base_indent if indent is None else indent
+
+    @staticmethod
+    def arguments(line):
+        """
+        arguments(line) -> list of the arguments of a macro, with quotes
+        """
+        return [quoted if quoted else plain for (quoted, plain) in re.findall(r'"((?:[^"]|"")*)"|(\S+)', line)]
+
+    def width_argument(self, value, default=BASE_INDENT):
+        match = re.match(r'(\d+(?:\.\d+)?)', value or '')
+        return int(float(match.group(1))) if match else default
+
+    def condition(self, line):
+        """
+        condition(self, line) -> (result, rest of the line)
+
+        Just the conditions of nroff output are evaluated, the rest are false
+        """
+        line = line.lstrip()
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        if line and line[0] in 'ntoe':
+            result = line[0] == 'n'
+            rest = line[1:]
+        else:
+            part = line.split(None, 1)
+            result = False
+            rest = ' ' + part[1] if len(part) > 1 else ''
+        return result != negate, rest.lstrip()
+
+    def render(self, source):
+        lines = source.replace('\r', '').split('\n')
+        skip_until = None
+        skip_depth = 0
+        last_condition = True
+        position = 0
+        while position < len(lines):
+            line = lines[position]
+            position += 1
+            # Line continuation
+            while line.endswith('\\') and not line.endswith('\\\\') and position < len(lines):
+                line = line[:-1] + lines[position]
+                position += 1
+            if skip_until is not None:
+                if line.strip() == '.' + skip_until:
+                    skip_until = None
+                continue
+            if skip_depth:
+                skip_depth += line.count('\\{') - line.count('\\}')
+                continue
+            if line.startswith(('.\\"', "'\\\"", '\\"')) or line.strip() in ('.', "'", '\\}', '.\\}'):
+                continue
+            if self.in_table:
+                if line.startswith('.TE'):
+                    self.in_table = False
+                    continue
+                if self.table_format:
+                    self.table_format = not line.rstrip().endswith('.')
+                    continue
+                if line.startswith('.'):
+                    continue
+                cells = [self.text(cell).strip() for cell in line.split('\t')]
+                if cells in (['_'], ['='], ['']):
+                    continue
+                self.write(' ' * self.indent + '   '.join(cells))
+                continue
+            if line[:1] not in ('.', "'"):
+                self.add_text(self.text(line))
+                continue
+
+            request = line[1:].lstrip()
+            name, _, rest = request.partition(' ')
+            if '\t' in name:
+                name, _, tab_rest = name.partition('\t')
+                rest = tab_rest + ' ' + rest
+            if name in MDOC_MACROS:
+                return None
+            if name in ('if', 'ie', 'el'):
+                if name == 'el':
+                    result, rest = (not last_condition), rest.lstrip()
+                else:
+                    result, rest = self.condition(rest)
+                    if name == 'ie':
+                        last_condition = result
+                body = rest
+                if body.startswith('\\{'):
+                    body = body[2:]
+                    if not result:
+                        skip_depth = 1 + body.count('\\{') - body.count('\\}')
+                        continue
+                if result:
+                    body = body.replace('\\}', '').strip()
+                    if body:
+                        lines.insert(position, body)
+                continue
+            if name in ('de', 'ig', 'am'):
+                # Definitions end with ".." or the given end macro
+                end = rest.split()[1:] if name != 'ig' else rest.split()
+                skip_until = end[0] if end else '.'
+                continue
+            if name == 'ds':
+                string, _, value = rest.partition(' ')
+                self.strings[string] = self.text(value.lstrip('"'))
+                continue
+            if name == 'TS':
+                self.flush()
+                self.in_table = True
+                self.table_format = True
+                continue
+            arguments = self.arguments(rest)
+            if name in ('SH', 'SS'):
+                self.flush()
+                self.hanging = None
+                self.tag_pending = False
+                self.relative_indents = []
+                self.base_indent = BASE_INDENT
+                self.indent = BASE_INDENT
+                title = ' '.join(self.text(argument) for argument in arguments)
+                if not title and position < len(lines):
+                    title = self.text(lines[position])
+                    position += 1
+                if self.output:
+                    self.blank()
+                self.output.append((' ' * (SUBSECTION_INDENT if name == 'SS' else 0)) + title.strip())
+                self.at_header = True
+                continue
+            if name in PARAGRAPH_MACROS:
+                self.paragraph()
+                continue
+            if name == 'TP':
+                self.paragraph(self.base_indent + self.width_argument(arguments[0] if arguments else None))
+                self.tag_pending = True
+                continue
+            if name == 'IP':
+                indent = self.width_argument(arguments[1] if len(arguments) > 1 else None)
+                self.paragraph(self.base_indent + indent)
+                if arguments and arguments[0]:
+                    self.hanging = (self.text(arguments[0]), self.base_indent)
+                continue
+            if name == 'RS':
+                self.flush()
+                self.relative_indents.append(self.base_indent)
+                self.base_indent = self.base_indent + self.width_argument(arguments[0] if arguments else None)
+                self.indent = self.base_indent
+                continue
+            if name == 'RE':
+                self.flush()
+                if self.relative_indents:
+                    self.base_indent = self.relative_indents.pop()
+                self.indent = self.base_indent
+                continue
+            if name in ('br', 'sp', 'ne', 'bp'):
+                self.flush()
+                self.flush_tag()
+                if name == 'sp':
+                    self.blank()
+                continue
+            if name in ('nf', 'EX'):
+                self.flush()
+                self.fill = False
+                continue
+            if name in ('fi', 'EE'):
+                self.fill = True
+                continue
+            if name in FONT_MACROS or name in ('UR', 'MT', 'SY'):
+                if arguments:
+                    self.add_text(' '.join(self.text(argument) for argument in arguments))
+                elif name in FONT_MACROS and position < len(lines):
+                    self.add_text(self.text(lines[position]))
+                    position += 1
+                continue
+            if name in ALTERNATING_MACROS:
+                self.add_text(''.join(self.text(argument) for argument in arguments))
+                continue
+            if name == 'OP':
+                self.add_text('[' + ' '.join(self.text(argument) for argument in arguments) + ']')
+                continue
+            # The rest of requests and macros have nothing to write
+        self.flush()
+        self.flush_tag()
+        while self.output and not self.output[-1]:
+            self.output.pop()
+        return '\n'.join(self.output) + '\n' if self.output else ''
@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+from django.core.management.base import BaseCommand, CommandError
+
+from extracts import ExtractProgress, execute_extract
+
+# Width of the progress bar, in characters
+BAR_WIDTH = 30
+# Seconds between the updates of the progress line
+PROGRESS_INTERVAL = 0.2
+
+
+class ConsoleProgress(ExtractProgress):
+    """
+    ConsoleProgress(ExtractProgress)
+
+    Progress of an extract drawn as a single line in <stream>, the phases already finished
+    are kept in <phases> for the final summary
+    """
+    def __init__(self, stream, interval=PROGRESS_INTERVAL):
+        ExtractProgress.__init__(self, interval=interval)
+        self.stream = stream
+        self.phases = []
+
+    def start(self, phase, total=None):
+        """
+        start(self, phase, total=None)
+        """
+        self.finish()
+        ExtractProgress.start(self, phase, total)
+
+    def finish(self):
+        """
+        finish(self)
+
+        Keep the counters of the current phase and end its progress line
+        """
+        if self.phase is None:
+            return
+        self.publish(force=True)
+        self.stream.write('\n')
+        self.phases.append((self.phase, self.done, time.time() - self.phase_started))
+        self.phase = None
+
+    def publish(self, force=False):
+        """
+        publish(self, force=False)
+
+        Draw the progress line, unless it was drawn less than <interval> seconds ago
+        """
+        now = time.time()
+        if self.phase is None or (not force and now - self.last_publish < self.interval):
+            return
+        self.last_publish = now
+        meta = self.meta()
+        if meta['total']:
+            filled = int(BAR_WIDTH * min(meta['done'], meta['total']) / meta['total'])
+            line = "{0:<8} [{1}{2}] {3}/{4} {5:5.1f}%".format(
+                meta['phase'], '#' * filled, '.' * (BAR_WIDTH - filled), meta['done'], meta['total'],
+                meta['percent'])
+        else:
+            line = "{0:<8} {1}".format(meta['phase'], meta['done'])
+        line += " {0:8.1f}/s".format(meta['pages_per_second'])
+        if meta['eta'] is not None:
+            line += " eta {0}s".format(meta['eta'])
+        self.stream.write('\r' + line)
+        self.stream.flush()
+
+
+class Command(BaseCommand):
+    help = """extract
+        Usage:
+        python manage.py (or ./manage.py) extract --category <category> [options]
+
+        Run an extract in this process, without the web form, celery or a broker:
+            2   -   OS, local or remote with --host
+            3   -   Product, --source and --path, local or remote with --host
+            4   -   Robot Framework, --source and --zip
+            5   -   External Library, --source and --url, --spec or --library
+            6   -   Reparse the stored man pages of --source
+            7   -   Tar archive of man pages, --archive and --source or --name
+
+        The progress is drawn in stderr and a summary with the throughput is printed at the end.
+        The output of the extract itself is shown with --verbosity 2
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', type=int, required=True, choices=range(2, 8))
+        parser.add_argument('--source', type=int, help="id of the source")
+        parser.add_argument('--host')
+        parser.add_argument('--username')
+        parser.add_argument('--password')
+        parser.add_argument('--port', type=int, default=22)
+        parser.add_argument('--profile', action='append', dest='profiles', type=int,
+                            help="id of a server profile, it can be repeated")
+        parser.add_argument('--path', help="directory of the commands of a Product")
+        parser.add_argument('--regex', help="regular expression of the arguments of a Product")
+        parser.add_argument('--zip', help="zip of the Robot Framework documentation")
+        parser.add_argument('--url', help="url of the libdoc page of a library")
+        parser.add_argument('--spec', help="libdoc XML or JSON spec of a library")
+        parser.add_argument('--library', help="library importable in this environment")
+        parser.add_argument('--archive', help="tar archive of a man directory")
+        parser.add_argument('--compgen', help="output of compgen -c in the host of the archive")
+        parser.add_argument('--name', help="name of the OS of the archive")
+        parser.add_argument('--os-version', dest='os_version', help="version of the OS of the archive")
+        parser.add_argument('--workers', type=int, help="processes used to fetch and parse")
+        parser.add_argument('--batch-size', type=int, help="commands written per transaction")
+        parser.add_argument('--force', action='store_true', help="parse again what did not change")
+        parser.add_argument('--no-corpus', action='store_true', help="do not store the raw man pages")
+
+    def handle(self, *args, **options):
+        config = {'category': options['category']}
+        for key in ('source', 'host', 'username', 'password', 'path', 'regex', 'zip', 'url', 'spec',
+                    'library', 'archive', 'compgen', 'name', 'profiles', 'workers', 'force'):
+            if options[key]:
+                config[key] = options[key]
+        if options['host']:
+            config['port'] = options['port']
+        if options['os_version']:
+            config['version'] = options['os_version']
+        if options['batch_size']:
+            config['batch_size'] = options['batch_size']
+        if options['no_corpus']:
+            config['corpus'] = False
+        for key in ('zip', 'spec', 'archive', 'compgen'):
+            if key in config and not os.path.isfile(config[key]):
+                raise CommandError("{0} does not exist".format(config[key]))
+
+        progress = ConsoleProgress(sys.stderr)
+        started = time.time()
+        try:
+            if options['verbosity'] >= 2:
+                summary = execute_extract(config, progress=progress)
+            else:
+                # The extracts print every command they work in
+                with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                    summary = execute_extract(config, progress=progress)
+        except Exception as error:
+            progress.finish()
+            raise CommandError("Extract failed: {0}".format(error))
+        progress.finish()
+        elapsed = time.time() - started
+
+        self.stdout.write("Extract finished in {0:.1f}s".format(elapsed))
+        for (phase, done, seconds) in progress.phases:
+            rate = done / seconds if seconds > 0 else 0.0
+            self.stdout.write("  {0:<8} {1:>8} in {2:8.1f}s {3:10.1f}/s".format(phase, done, seconds, rate))
+        self.stdout.write("  added {0}, changed {1}, unchanged {2}, removed {3}".format(
+            summary.get('added', 0), summary.get('changed', 0), summary.get('unchanged', 0),
+            summary.get('removed', 0)))
+        for error in summary.get('errors', []):
+            self.stderr.write("  {0}".format(error))
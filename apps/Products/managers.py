@@ -0,0 +1,87 @@
+from django.db import connections, models, router
+
+
+def upsert(model, rows, unique_fields, update_fields=(), using=None):
+    """
+    upsert(model, rows, unique_fields, update_fields=(), using=None) -> number of rows written
+
+    Insert <rows>, a list of dictionaries of field values by attname (e.g. command_id) with
+    the same keys, into the table of <model> in a single statement per batch. The rows that
+    conflict with an existing one on the unique index of <unique_fields> are skipped or, when
+    <update_fields> is given, those fields are updated:
+        PostgreSQL and SQLite >= 3.24 - INSERT ... ON CONFLICT
+        MySQL                         - INSERT IGNORE / ON DUPLICATE KEY UPDATE
+        Older SQLite                  - INSERT OR IGNORE followed by an UPDATE per row
+
+    It works with models without a custom manager, like the through models of ManyToManyFields
+    """
+    if not rows:
+        return 0
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    names = list(rows[0])
+    fields = [model._meta.get_field(name) for name in names]
+    columns = [quote(field.column) for field in fields]
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in unique_fields)
+    updates = [quote(model._meta.get_field(name).column) for name in update_fields]
+    table = quote(model._meta.db_table)
+    unique_attnames = [model._meta.get_field(name).attname for name in unique_fields]
+    update_attnames = [model._meta.get_field(name).attname for name in update_fields]
+
+    insert = 'INSERT'
+    suffix = ''
+    per_row_update = False
+    if connection.vendor == 'mysql':
+        if updates:
+            suffix = ' ON DUPLICATE KEY UPDATE {0}'.format(
+                ', '.join('{0} = VALUES({0})'.format(column) for column in updates))
+        else:
+            insert = 'INSERT IGNORE'
+    elif connection.vendor == 'sqlite' and connection.Database.sqlite_version_info < (3, 24, 0):
+        insert = 'INSERT OR IGNORE'
+        per_row_update = bool(updates)
+    elif updates:
+        suffix = ' ON CONFLICT ({0}) DO UPDATE SET {1}'.format(
+            conflict, ', '.join('{0} = EXCLUDED.{0}'.format(column) for column in updates))
+    else:
+        suffix = ' ON CONFLICT ({0}) DO NOTHING'.format(conflict)
+
+    # SQLite does not accept more than 999 parameters per statement
+    batch_size = max(1, 999 // len(names)) if connection.vendor == 'sqlite' else 1000
+    placeholder = '({0})'.format(', '.join(['%s'] * len(names)))
+    written = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = []
+            for row in batch:
+                params.extend(field.get_db_prep_save(row[name], connection) for (name, field) in zip(names, fields))
+            sql = '{0} INTO {1} ({2}) VALUES {3}{4}'.format(
+                insert, table, ', '.join(columns), ', '.join([placeholder] * len(batch)), suffix)
+            cursor.execute(sql, params)
+            written += max(cursor.rowcount, 0)
+            if per_row_update:
+                for row in batch:
+                    model._base_manager.using(using).filter(
+                        **{attname: row[attname] for attname in unique_attnames}
+                    ).update(**{attname: row[attname] for attname in update_attnames})
+    return written
+
+
+class UpsertQuerySet(models.QuerySet):
+    """
+    UpsertQuerySet
+
+    QuerySet with the upsert ingestion path used by the extracts
+    """
+    def upsert(self, rows, unique_fields, update_fields=()):
+        """
+        upsert(self, rows, unique_fields, update_fields=()) -> number of rows written
+
+        Check upsert of apps/Products/managers.py
+        """
+        return upsert(self.model, rows, unique_fields, update_fields=update_fields, using=self.db)
+
+
+UpsertManager = models.Manager.from_queryset(UpsertQuerySet)
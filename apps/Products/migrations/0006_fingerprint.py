@@ -0,0 +1,41 @@
+# Generated by Django 2.1.7 on 2026-10-18 09:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Products', '0005_auto_20171017_1703'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('digest', models.CharField(max_length=40, verbose_name='digest')),
+            ],
+            options={
+                'verbose_name': 'fingerprint',
+                'verbose_name_plural': 'fingerprints',
+                'db_table': 'fingerprints',
+            },
+        ),
+        migrations.AddField(
+            model_name='fingerprint',
+            name='command',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='Products.Command'),
+        ),
+        migrations.AddField(
+            model_name='fingerprint',
+            name='source',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Products.Source'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='fingerprint',
+            unique_together={('source', 'name')},
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.1.7 on 2026-10-18 10:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_arguments(apps, schema_editor):
+    """
+    Link every argument to its command with Argument.command, the arguments shared by several
+    commands through Command.arguments (like the ones of 0002) are copied for each of them
+    """
+    Command = apps.get_model('Products', 'Command')
+    Argument = apps.get_model('Products', 'Argument')
+    through = Command.arguments.through
+    for (command_id, argument_id) in through.objects.order_by('pk').values_list('command_id', 'argument_id'):
+        argument = Argument.objects.get(pk=argument_id)
+        if argument.command_id is None:
+            Argument.objects.filter(pk=argument_id).update(command_id=command_id)
+        elif argument.command_id != command_id:
+            argument.pk = None
+            argument.command_id = command_id
+            argument.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Products', '0006_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='argument',
+            name='command',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='Products.Command'),
+        ),
+        migrations.RunPython(move_arguments, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='command',
+            name='arguments',
+        ),
+        migrations.AddField(
+            model_name='argument',
+            name='exclude',
+            field=models.ManyToManyField(blank=True, help_text='Choose parameters that should be excluded if this is set.', related_name='_argument_exclude_+', to='Products.Argument', verbose_name='exclude'),
+        ),
+        migrations.AddField(
+            model_name='argument',
+            name='include',
+            field=models.ManyToManyField(blank=True, help_text='Choose mandatory parameters if this is set.', related_name='_argument_include_+', to='Products.Argument', verbose_name='include'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:02
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def command_digest(name, description, arguments):
+    """
+    Copy of apps.Products.models.command_digest as it was when the digests were backfilled
+    """
+    content = [
+        name,
+        description,
+        sorted(
+            [argument['name'], argument.get('description') or '', bool(argument.get('needs_value')),
+             bool(argument.get('requirement'))]
+            for argument in arguments
+        )
+    ]
+    return hashlib.sha1(json.dumps(content).encode('utf-8', errors='replace')).hexdigest()
+
+
+def backfill_digests(apps, schema_editor):
+    """
+    Content digest of the existing commands, with the arguments they have now
+    """
+    Command = apps.get_model('Products', 'Command')
+    Argument = apps.get_model('Products', 'Argument')
+    command_ids = list(Command.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(command_ids), BATCH_SIZE):
+        batch = command_ids[start:start + BATCH_SIZE]
+        arguments = dict()
+        for argument in Argument.objects.filter(command_id__in=batch).values(
+                'command_id', 'name', 'description', 'requirement', 'needs_value'):
+            arguments.setdefault(argument.pop('command_id'), []).append(argument)
+        for (pk, name, description) in Command.objects.filter(pk__in=batch).values_list('pk', 'name', 'description'):
+            digest = command_digest(name, description, arguments.get(pk, []))
+            Command.objects.filter(pk=pk).update(digest=digest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Products', '0007_argument_command'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='command',
+            name='digest',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40, verbose_name='digest'),
+        ),
+        migrations.RunPython(backfill_digests, migrations.RunPython.noop),
+    ]
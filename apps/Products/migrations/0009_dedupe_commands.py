@@ -0,0 +1,75 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+BATCH_SIZE = 500
+
+
+def _delete_arguments(cursor, argument_ids):
+    """
+    Delete the arguments <argument_ids> with their include and exclude links, with SQL so the
+    rows are removed in batches without loading them
+    """
+    for start in range(0, len(argument_ids), BATCH_SIZE):
+        batch = argument_ids[start:start + BATCH_SIZE]
+        placeholders = ', '.join(['%s'] * len(batch))
+        for table in ('arguments_include', 'arguments_exclude'):
+            cursor.execute(
+                'DELETE FROM {0} WHERE from_argument_id IN ({1}) OR to_argument_id IN ({1})'.format(table, placeholders),
+                batch + batch
+            )
+        cursor.execute('DELETE FROM arguments WHERE id IN ({0})'.format(placeholders), batch)
+
+
+def dedupe(apps, schema_editor):
+    """
+    Merge the commands with the same digest and the arguments with the same command and name,
+    the oldest row is kept, so the unique indexes of 0010 can be created
+    """
+    Command = apps.get_model('Products', 'Command')
+    Fingerprint = apps.get_model('Products', 'Fingerprint')
+    through = Command.source.through
+    Command.objects.filter(digest='').update(digest=None)
+
+    with schema_editor.connection.cursor() as cursor:
+        duplicates = (Command.objects.exclude(digest=None).values('digest')
+                      .annotate(total=Count('id'), keep=Min('id')).filter(total__gt=1))
+        for duplicate in duplicates:
+            keep = duplicate['keep']
+            others = list(Command.objects.filter(digest=duplicate['digest']).exclude(pk=keep)
+                          .values_list('pk', flat=True))
+            linked = set(through.objects.filter(command=keep).values_list('source', flat=True))
+            for source_id in set(through.objects.filter(command__in=others).values_list('source', flat=True)):
+                if source_id not in linked:
+                    through.objects.create(command_id=keep, source_id=source_id)
+            through.objects.filter(command__in=others).delete()
+            Fingerprint.objects.filter(command__in=others).update(command=keep)
+            # Same digest, same arguments, the ones of the duplicates are deleted with them
+            placeholders = ', '.join(['%s'] * len(others))
+            cursor.execute('SELECT id FROM arguments WHERE command_id IN ({0})'.format(placeholders), others)
+            _delete_arguments(cursor, [row[0] for row in cursor.fetchall()])
+            cursor.execute('DELETE FROM commands WHERE id IN ({0})'.format(placeholders), others)
+
+        cursor.execute(
+            'SELECT id FROM arguments WHERE command_id IS NOT NULL AND id > '
+            '(SELECT MIN(kept.id) FROM arguments kept WHERE kept.command_id = arguments.command_id '
+            'AND kept.name = arguments.name)'
+        )
+        _delete_arguments(cursor, [row[0] for row in cursor.fetchall()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Products', '0008_command_digest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='command',
+            name='digest',
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True, verbose_name='digest'),
+        ),
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Products', '0009_dedupe_commands'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='command',
+            name='digest',
+            field=models.CharField(blank=True, max_length=40, null=True, unique=True, verbose_name='digest'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='argument',
+            unique_together={('command', 'name')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.1.7 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Products', '0010_unique_commands'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Checkpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='key')),
+                ('commands', models.TextField(blank=True, verbose_name='commands')),
+                ('done', models.TextField(blank=True, verbose_name='done')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='updated')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Products.Source')),
+            ],
+            options={
+                'verbose_name': 'checkpoint',
+                'verbose_name_plural': 'checkpoints',
+                'db_table': 'checkpoints',
+            },
+        ),
+    ]
@@ -1,6 +1,31 @@
+import hashlib
+import json
+
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
+from .managers import UpsertManager
+
+
+def command_digest(name, description, arguments):
+    """
+    command_digest(name, description, arguments) -> sha1 hexdigest
+
+    Content identity of a command, <arguments> is a list of dictionaries with the Argument
+    fields (name, description, requirement, needs_value). Commands with the same digest are
+    the same command, whatever Source they were extracted from
+    """
+    content = [
+        name,
+        description,
+        sorted(
+            [argument['name'], argument.get('description') or '', bool(argument.get('needs_value')),
+             bool(argument.get('requirement'))]
+            for argument in arguments
+        )
+    ]
+    return hashlib.sha1(json.dumps(content).encode('utf-8', errors='replace')).hexdigest()
+
 
 class Source(models.Model):
     """
@@ -51,10 +76,16 @@ class Command(models.Model):
         name - CharField
         description - TextField
         source - ManyToManyField(Source)
+        digest - CharField - command_digest of the name, description and arguments, the
+                 extracts share one row between all the sources with the same command.
+                 It is unique, the commands created by hand have no digest
     """
     name = models.CharField(_('command'), max_length=255)
     description = models.TextField(_('description'), blank=True)
     source = models.ManyToManyField(Source, blank=True)
+    digest = models.CharField(_('digest'), max_length=40, blank=True, null=True, unique=True)
+
+    objects = UpsertManager()
 
     class Meta:
         verbose_name = _('command')
@@ -108,7 +139,7 @@ class Argument(models.Model):
     Model used to keep the arguments of commands
 
         command - ForeignKey(Command)
-        name - CharField
+        name - CharField - unique per command
         description - TextField
         requirement - BooleanField
         needs_value - BooleanField
@@ -123,11 +154,72 @@ class Argument(models.Model):
     include = models.ManyToManyField('self', verbose_name=_("include"), blank=True, related_name='include', help_text="Choose mandatory parameters if this is set.")
     exclude = models.ManyToManyField('self', verbose_name=_("exclude"), blank=True, related_name='exclude', help_text="Choose parameters that should be excluded if this is set.")
 
+    objects = UpsertManager()
+
     class Meta:
         verbose_name = _('argument')
         verbose_name_plural = _('arguments')
         db_table = 'arguments'
         ordering = ['id']
+        unique_together = ('command', 'name')
 
     def __str__(self):
         return "{}".format(self.name)
+
+
+class Fingerprint(models.Model):
+    """
+    Fingerprint
+
+    Model used to keep the hash of the raw documentation (man page or libdoc entry) of every
+    command extracted from a source, so a new extract can skip the commands that did not change
+
+        source - ForeignKey(Source)
+        name - CharField - command name as it was extracted
+        digest - CharField - sha1 of the raw documentation
+        command - ForeignKey(Command)
+    """
+    source = models.ForeignKey(Source, on_delete=models.CASCADE)
+    name = models.CharField(_('name'), max_length=255)
+    digest = models.CharField(_('digest'), max_length=40)
+    command = models.ForeignKey(Command, on_delete=models.SET_NULL, null=True, blank=True)
+
+    objects = UpsertManager()
+
+    class Meta:
+        verbose_name = _('fingerprint')
+        verbose_name_plural = _('fingerprints')
+        db_table = 'fingerprints'
+        unique_together = ('source', 'name')
+
+    def __str__(self):
+        return "{0} - {1}".format(self.name, self.digest)
+
+
+class Checkpoint(models.Model):
+    """
+    Checkpoint
+
+    Model used to keep the progress of an extract, so a retried task resumes it instead of
+    starting over
+
+        key - CharField - id of the celery task of the extract
+        source - ForeignKey(Source)
+        commands - TextField - JSON list of the commands of the extract
+        done - TextField - JSON {command: digest} of the commands already persisted, the digest
+                           is empty for the commands without a man page
+        updated - DateTimeField
+    """
+    key = models.CharField(_('key'), max_length=255, unique=True)
+    source = models.ForeignKey(Source, on_delete=models.CASCADE)
+    commands = models.TextField(_('commands'), blank=True)
+    done = models.TextField(_('done'), blank=True)
+    updated = models.DateTimeField(_('updated'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('checkpoint')
+        verbose_name_plural = _('checkpoints')
+        db_table = 'checkpoints'
+
+    def __str__(self):
+        return "{0} - {1}".format(self.key, self.source)
@@ -0,0 +1,193 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+import paramiko
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+
+
+class SSHPool:
+    """
+    Pool of connected ssh clients of a worker process, keyed by host, port, user and a digest
+    of the password, so a client is only reused with the credentials it was opened with.
+
+    Idle clients are health-checked before they are reused and closed when they are idle for
+    more than <idle_timeout> seconds. The pool counts its hits and misses, check metrics
+    """
+
+    def __init__(self, idle_timeout=None, max_idle=None):
+        """
+        __init__(self, idle_timeout=None, max_idle=None)
+
+        <idle_timeout> (settings.CTA_SSH_POOL_IDLE_TIMEOUT by default) is the seconds an idle
+        client is kept, <max_idle> (settings.CTA_SSH_POOL_MAX_IDLE by default) the idle
+        clients kept per key
+        """
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        # key -> list of (client, time it was released)
+        self.idle = dict()
+        # id of the clients in use -> key
+        self.in_use = dict()
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0, 'broken': 0}
+
+    def _settings(self):
+        idle_timeout = self.idle_timeout
+        if idle_timeout is None:
+            idle_timeout = settings.CTA_SSH_POOL_IDLE_TIMEOUT
+        max_idle = self.max_idle
+        if max_idle is None:
+            max_idle = settings.CTA_SSH_POOL_MAX_IDLE
+        return idle_timeout, max_idle
+
+    @staticmethod
+    def key(config):
+        """
+        key(config) -> (host, port, user, password digest)
+
+        <config> has the keys "host", "port", "user" and "passwd" of a server profile
+        """
+        port = int(config.get('port') or 22)
+        password = (config.get('passwd') or '').encode('utf-8')
+        return config.get('host'), port, config.get('user'), hashlib.sha256(password).hexdigest()
+
+    @staticmethod
+    def is_healthy(client):
+        """
+        is_healthy(client) -> True | False
+
+        The transport of <client> is still open and authenticated, an ignore message is sent
+        so a closed socket is found before the client is used
+        """
+        transport = client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+        except (paramiko.SSHException, EOFError, OSError):
+            return False
+        return True
+
+    def acquire(self, config):
+        """
+        acquire(self, config) -> paramiko.SSHClient
+
+        Reuse an idle client of the host of <config> or connect a new one. The client must be
+        given back with release
+        """
+        key = self.key(config)
+        self.evict_expired()
+        while True:
+            with self.lock:
+                clients = self.idle.get(key)
+                if not clients:
+                    break
+                client, released = clients.pop()
+            if self.is_healthy(client):
+                with self.lock:
+                    self.stats['hits'] += 1
+                    self.in_use[id(client)] = key
+                return client
+            with self.lock:
+                self.stats['broken'] += 1
+            client.close()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(key[0], username=key[2], password=config.get('passwd'), port=key[1])
+        with self.lock:
+            self.stats['misses'] += 1
+            self.in_use[id(client)] = key
+        return client
+
+    def release(self, client, broken=False):
+        """
+        release(self, client, broken=False)
+
+        Give back a client of acquire, it is closed when it is <broken>, its transport is
+        not active anymore or there are enough idle clients of its host
+        """
+        idle_timeout, max_idle = self._settings()
+        transport = client.get_transport()
+        reusable = not broken and idle_timeout > 0 and transport is not None and transport.is_active()
+        with self.lock:
+            key = self.in_use.pop(id(client), None)
+            if reusable and key is not None and len(self.idle.get(key, [])) < max_idle:
+                self.idle.setdefault(key, []).append((client, time.time()))
+                return
+        client.close()
+
+    def evict_expired(self):
+        """
+        evict_expired(self)
+
+        Close the clients that are idle for more than <idle_timeout> seconds
+        """
+        idle_timeout = self._settings()[0]
+        limit = time.time() - idle_timeout
+        expired = []
+        with self.lock:
+            for (key, clients) in list(self.idle.items()):
+                expired.extend(client for (client, released) in clients if released < limit)
+                clients[:] = [(client, released) for (client, released) in clients if released >= limit]
+                if not clients:
+                    del self.idle[key]
+            self.stats['evicted'] += len(expired)
+        for client in expired:
+            client.close()
+
+    def close_all(self):
+        """
+        close_all(self)
+
+        Close all the idle clients
+        """
+        with self.lock:
+            clients = [client for values in self.idle.values() for (client, released) in values]
+            self.idle = dict()
+        for client in clients:
+            client.close()
+
+    def metrics(self):
+        """
+        metrics(self) -> dictionary
+
+        Counters of the pool: hits, misses, evicted (idle timeout), broken (failed health
+        check), the clients in use and idle, and the hit ratio
+        """
+        with self.lock:
+            result = dict(self.stats)
+            result['in_use'] = len(self.in_use)
+            result['idle'] = sum(len(clients) for clients in self.idle.values())
+        requests = result['hits'] + result['misses']
+        result['hit_ratio'] = round(result['hits'] / requests, 3) if requests else None
+        return result
+
+    @contextmanager
+    def connection(self, config):
+        """
+        connection(self, config)
+
+        Context manager of a client of the host of <config>, it is released when the block
+        ends and discarded when the block raises an ssh error
+        """
+        client = self.acquire(config)
+        broken = False
+        try:
+            yield client
+        except (paramiko.SSHException, EOFError, OSError):
+            broken = True
+            raise
+        finally:
+            self.release(client, broken=broken)
+
+
+# Pool of the worker process
+pool = SSHPool()
+
+
+@worker_process_shutdown.connect
+def _close_pool(**kwargs):
+    pool.close_all()
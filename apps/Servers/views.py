@@ -1,4 +1,5 @@
 import json
+import logging
 import paramiko
 from django.conf import settings
 from django.contrib import messages
@@ -15,11 +16,15 @@ from string import ascii_lowercase, digits
 
 from apps.Products.models import Source
 from apps.Testings.models import Keyword, TestCase, TestSuite
+from . import ssh_pool
+from .workspace import UploadBatch, fetch_results, resource_name
 from .forms import ServerProfileForm, ServerTemplateForm, ParametersForm
 from .models import TemplateServer, ServerProfile, Parameters
 
 from celery import shared_task
 
+logger = logging.getLogger(__name__)
+
 
 class ServerTemplateView(LoginRequiredMixin, HasPermissionsMixin, TemplateView):
     template_name = "servers-templates.html"
@@ -239,23 +244,30 @@ def get_config_object(params):
 
 
 def get_connection(config):
-    """Create a paramiko connection for ssh communication"""
+    """Get a paramiko connection for ssh communication, reused from the ssh pool of the worker
+    when there is an idle one of the same host. It must be given back with release_connection"""
     try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        _port = 22
-        if config.get('port'):
-            _port = int(config.get('port'))
-        client.connect(
-            config.get('host'),
-            username=config.get('user'),
-            password=config.get('passwd'),
-            port=_port)
+        client = ssh_pool.pool.acquire(config)
     except Exception as error:
         client = error
     return client
 
 
+def release_connection(client, broken=False):
+    """Give back a connection of get_connection to the ssh pool"""
+    if isinstance(client, paramiko.SSHClient):
+        ssh_pool.pool.release(client, broken=broken)
+        logger.debug("ssh pool: %s", ssh_pool.pool.metrics())
+
+
+def raise_error(error):
+    """Raise the error of the result of generate_file, run_script or get_result_files keeping its
+    type, so run_on_server does not give back a broken ssh connection to the pool"""
+    if isinstance(error, Exception):
+        raise error
+    raise Exception(error)
+
+
 def generate_filename(_script):
     """Generate a string like NAME_w0ln0t"""
     name = _script.replace(" ", "")
@@ -263,21 +275,6 @@ def generate_filename(_script):
     return '{0}_{1}'.format(name, random_string)
 
 
-def check_dirs_destiny(path, client):
-    """First need to know if the dirs schema exist"""
-    try:
-        exist = True
-        sftp = client.open_sftp()
-        try:
-            sftp.listdir(path)
-        except IOError:
-            sftp.mkdir(path)
-        sftp.close()
-    except Exception as error:
-        exist = False
-    return exist
-
-
 def search_for_script_names(script):
     _items = dict()
     result = []
@@ -311,28 +308,6 @@ def search_for_libraries_names(script, extra=None):
     return _items
 
 
-def send_files(filename, file_type, config, client):
-    """sent files Via SSH"""
-    _data = dict()
-    try:
-        path = config.get('path')
-        dirs = ['Keywords', 'Libraries', 'Profiles', 'Resources', 'Templates', 'TestScripts', 'Tools', 'TestSuites',
-                'Results']
-        for directory in dirs:
-            new_path = "{0}/{1}".format(path, directory)
-            res = check_dirs_destiny(new_path, client)
-            if not res:
-                raise Exception(
-                    "Destination directory does not exist, you don't have write permission. Or can't connect to server")
-        """SCPCLient takes a paramiko transport as its only argument"""
-        scp = SCPClient(client.get_transport())
-        scp.put(filename, remote_path='{0}/{1}'.format(path, dirs[file_type]))
-        scp.close()
-    except Exception as error:
-        _data['text'] = error
-    return _data
-
-
 def run_script(filename, params, client, type_script):
     """This execute pybot with some flags """
     _data = dict()
@@ -388,10 +363,11 @@ def get_libraries(obj=None, extra=None):
     return libraries
 
 
-def generate_profile(params, filename):
+def generate_profile(params, filename, batch):
+    """Write the variables Profile File in memory, it is queued in the batch"""
     arguments = params.get('global_variables')
     variables = []
-    var_file = open("{0}/profiles/{1}_profile.py".format(settings.MEDIA_ROOT, filename), "w")
+    var_file = batch.open("{0}_profile.py".format(filename), 2)
     var_file.write("#!/usr/bin/env python\n\n")
     for arg in arguments:
         if arg.get('value'):
@@ -400,10 +376,11 @@ def generate_profile(params, filename):
     for var in variables:
         var_file.write(var)
     var_file.close()
-    return var_file.name
 
 
-def generate_resource_files(extra_import):
+def generate_resource_files(extra_import, batch):
+    """Write the keyword resources in memory, they are queued in the batch named by the digest of
+    their script so the ones the server already has are not sent again"""
     list_resources = []
     pks_used = []
     inner_extras = []
@@ -417,13 +394,12 @@ def generate_resource_files(extra_import):
                     result = dict()
                     pks_used.append(current_pk)
                     obj = Keyword.objects.get(pk=current_pk)
-                    filename = generate_filename(obj.name)
-                    kwd_file = open("{0}/keywords/{1}_keyword.robot".format(settings.MEDIA_ROOT, filename), "w")
+                    filename = resource_name(obj.name, k.get('script'))
+                    kwd_file = batch.open("{0}_keyword.robot".format(filename), 0, cached=True)
                     kwd_file.write(k.get('script'))
                     kwd_file.close()
                     inner_extras = search_for_script_names(obj.script)
                     result['filename'] = filename
-                    result['resource'] = kwd_file.name
                     result['name'] = obj.name
                     list_resources.append(result)
         if extras:
@@ -432,12 +408,11 @@ def generate_resource_files(extra_import):
                     result = dict()
                     pks_used.append(str(pk))
                     obj = Keyword.objects.get(pk=pk)
-                    filename = generate_filename(obj.name)
-                    kwd_file = open("{0}/keywords/{1}_keyword.robot".format(settings.MEDIA_ROOT, filename), "w")
+                    filename = resource_name(obj.name, obj.script)
+                    kwd_file = batch.open("{0}_keyword.robot".format(filename), 0, cached=True)
                     kwd_file.write(obj.script)
                     kwd_file.close()
                     result['filename'] = filename
-                    result['resource'] = kwd_file.name
                     result['name'] = obj.name
                     list_resources.append(result)
         if inner_extras:
@@ -446,12 +421,11 @@ def generate_resource_files(extra_import):
                     result = dict()
                     pks_used.append(str(pk))
                     obj = Keyword.objects.get(pk=pk)
-                    filename = generate_filename(obj.name)
-                    kwd_file = open("{0}/keywords/{1}_keyword.robot".format(settings.MEDIA_ROOT, filename), "w")
+                    filename = resource_name(obj.name, obj.script)
+                    kwd_file = batch.open("{0}_keyword.robot".format(filename), 0, cached=True)
                     kwd_file.write(obj.script)
                     kwd_file.close()
                     result['filename'] = filename
-                    result['resource'] = kwd_file.name
                     result['name'] = obj.name
                     list_resources.append(result)
     except Exception as error:
@@ -463,26 +437,23 @@ def generate_file(obj, type_script, params, filename, client):
     _data_result = dict()
     try:
         config = params.get('config')
+        # All the files are written in memory and sent together at the end
+        batch = UploadBatch(client, config)
         libraries = Source.objects.filter(category=5).exclude(
             name__in=['Dialogs', 'Screenshot']
         ).values_list('name', flat=True)
         """Generate robot files"""
         if type_script is 1:
             extra_elements = json.loads(obj.extra_imports)
-            resources = generate_resource_files(extra_elements)
+            resources = generate_resource_files(extra_elements, batch)
 
             """First create the keyword file"""
-            kwd_file = open("{0}/test_keywords/{1}_keyword.robot".format(settings.MEDIA_ROOT, filename), "w")
+            kwd_file = batch.open("{0}_keyword.robot".format(filename), 0)
             kwd_file.write(obj.script)
             kwd_file.close()
 
-            """need to know if the dirs schema exist and then send the files"""
-            _data = send_files(kwd_file.name, 0, config, client)
-            if _data.get('text'):
-                raise Exception(_data.get('text'))
-
             """Then Test Case file"""
-            dummy_tc_file = open("{0}/test_keywords/{1}_test_case.robot".format(settings.MEDIA_ROOT, filename), "w")
+            dummy_tc_file = batch.open("{0}_test_case.robot".format(filename), 5)
             dummy_tc_file.write("*** Settings ***\n")
             dummy_tc_file.write("Resource\t{0}/Keywords/{1}_keyword.robot\n".format(config.get('path'), filename))
             """ Adding some resources"""
@@ -492,9 +463,6 @@ def generate_file(obj, type_script, params, filename, client):
                         config.get('path'),
                         resource.get('filename')
                     ))
-                    _data = send_files(resource.get('resource'), 0, config, client)
-                    if _data.get('text'):
-                        raise Exception(_data.get('text'))
             """Now add the libraries """
             dummy_tc_file.write("\n")
             if libraries:
@@ -513,8 +481,6 @@ def generate_file(obj, type_script, params, filename, client):
             dummy_tc_file.write("\n")
             dummy_tc_file.close()
 
-            send_files(dummy_tc_file.name, 5, config, client)
-
         elif type_script is 2:
             items = search_for_script_names(obj.script)
             if items.get('error'):
@@ -522,10 +488,10 @@ def generate_file(obj, type_script, params, filename, client):
 
             extra_elements = json.loads(obj.extra_imports)
             extra_elements['extra_resources'] = items.get('items')
-            resources = generate_resource_files(extra_elements)
+            resources = generate_resource_files(extra_elements, batch)
 
             """ Test Case"""
-            tc_file = open("{0}/test_cases/{1}_test_case.robot".format(settings.MEDIA_ROOT, filename), "w")
+            tc_file = batch.open("{0}_test_case.robot".format(filename), 5)
             tc_file.write("*** Settings ***\n")
             """ Adding some resources"""
             if resources:
@@ -534,9 +500,6 @@ def generate_file(obj, type_script, params, filename, client):
                         config.get('path'),
                         resource.get('filename')
                     ))
-                    _data = send_files(resource.get('resource'), 0, config, client)
-                    if _data.get('text'):
-                        raise Exception(_data.get('text'))
             """Now add the libraries """
             tc_file.write("\n")
             if libraries:
@@ -545,9 +508,6 @@ def generate_file(obj, type_script, params, filename, client):
                 tc_file.write("\n")
             tc_file.write(obj.script)
             tc_file.close()
-            check = send_files(tc_file.name, 5, config, client)
-            if check.get('text'):
-                raise Exception(check.get('text'))
 
         elif type_script is 3:
             """Test Suite """
@@ -556,10 +516,9 @@ def generate_file(obj, type_script, params, filename, client):
                 raise Exception(items.get('error'))
             extra_elements = json.loads(obj.extra_imports)
             extra_elements['extra_resources'] = items.get('items')
-            kwd_resources = generate_resource_files(extra_elements)
+            kwd_resources = generate_resource_files(extra_elements, batch)
 
-            ts_file = open("{0}/test_suites/{1}_test_suite.robot".format(settings.MEDIA_ROOT, filename),
-                           "w")
+            ts_file = batch.open("{0}_test_suite.robot".format(filename), 7)
             ts_file.write("*** Settings ***\n")
             if obj.description:
                 ts_file.write("    Documentation    {0}".format(obj.description))
@@ -572,9 +531,6 @@ def generate_file(obj, type_script, params, filename, client):
                         config.get('path'),
                         kwd.get('filename')
                     ))
-                    _data = send_files(kwd.get('resource'), 0, config, client)
-                    if _data.get('text'):
-                        raise Exception(_data.get('text'))
             """Now add the libraries """
             ts_file.write("\n")
             if libraries:
@@ -583,15 +539,11 @@ def generate_file(obj, type_script, params, filename, client):
                 ts_file.write("\n")
             ts_file.write(obj.script)
             ts_file.close()
-            check = send_files(ts_file.name, 7, config, client)
-            if check.get('text'):
-                raise Exception(check.get('text'))
 
         elif type_script is 4:
             """ Imported Keywords """
             """ Dummy Test Case file"""
-            dummy_tc_file = open("{0}/test_keywords/{1}_test_case.robot".format(settings.MEDIA_ROOT, filename),
-                                 "w")
+            dummy_tc_file = batch.open("{0}_test_case.robot".format(filename), 5)
             dummy_tc_file.write("*** Settings ***\n")
             dummy_tc_file.write("\n")
             if libraries:
@@ -600,15 +552,12 @@ def generate_file(obj, type_script, params, filename, client):
                 dummy_tc_file.write("\n")
             dummy_tc_file.write(obj.script)
             dummy_tc_file.close()
-            check = send_files(dummy_tc_file.name, 5, config, client)
-            if check.get('text'):
-                raise Exception(check.get('text'))
 
         """Need a variables Profile File"""
         arguments = params.get('global_variables')
         if arguments:
-            profile = generate_profile(params, filename)
-            send_files(profile, 2, config, client)
+            generate_profile(params, filename, batch)
+        batch.send()
         _data_result['text'] = 'Created'
     except Exception as error:
         _data_result['error'] = error
@@ -619,6 +568,12 @@ def get_result_files(client, filename, config):
     """Obtain the Results files (html and xml) for show it"""
     _data = dict()
     try:
+        if settings.CTA_WORKSPACE_ARCHIVE:
+            names = ['{0}_log.html'.format(filename), '{0}_output.xml'.format(filename),
+                     '{0}_report.html'.format(filename)]
+            fetch_results(client, config, names, '{0}/test_result/'.format(settings.MEDIA_ROOT))
+            _data['text'] = 'Success'
+            return _data
         scp = SCPClient(client.get_transport())
         scp.get('{0}/Results/{1}_log.html'.format(config.get('path'), filename),
                 '{0}/test_result/'.format(settings.MEDIA_ROOT))
@@ -627,7 +582,6 @@ def get_result_files(client, filename, config):
         scp.get('{0}/Results/{1}_report.html'.format(config.get('path'), filename),
                 '{0}/test_result/'.format(settings.MEDIA_ROOT))
         scp.close()
-        client.close()
         _data['text'] = 'Success'
     except Exception as error:
         _data['error'] = error
@@ -641,6 +595,8 @@ def run_on_server(_data):
     data_result = dict()
     params = dict()
     profile_category = 0
+    client = None
+    broken = False
     try:
         profiles = ServerProfile.objects.filter(pk__in=_data.get('profiles'))
         for profile in profiles:
@@ -654,6 +610,8 @@ def run_on_server(_data):
         configs = params.get('config')
         filename = _data.get('filename')
         client = get_connection(configs)
+        if isinstance(client, Exception):
+            raise client
         if type_script is 1:
             """is keywords"""
             obj = Keyword.objects.get(id=_data.get('obj_id'))
@@ -667,20 +625,25 @@ def run_on_server(_data):
             obj = TestSuite.objects.get(id=_data.get('obj_id'))
         _data = generate_file(obj, type_script, params, filename, client)
         if _data.get('error'):
-            raise Exception(_data['error'])
+            raise_error(_data['error'])
         if profile_category is 2:
             """Run pybot only if the user choose -> Local Network connection"""
             result = run_script(filename, params, client, type_script)
             if result.get('error'):
-                raise Exception(result.get('error'))
+                raise_error(result.get('error'))
             result = get_result_files(client, filename, configs)
             if result.get('error'):
-                raise Exception(result.get('error'))
+                raise_error(result.get('error'))
             data_result['link'] = "{0}/{1}test_result/{2}_report.html".format(settings.SITE_DNS,
                                                                               settings.MEDIA_URL,
                                                                               filename)
         else:
             data_result['text'] = 'Success'
+    except (paramiko.SSHException, EOFError, OSError) as error:
+        broken = True
+        data_result['error'] = '{0}'.format(error)
     except Exception as error:
         data_result['error'] = '{0}'.format(error)
+    finally:
+        release_connection(client, broken=broken)
     return data_result
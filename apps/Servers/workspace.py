@@ -0,0 +1,307 @@
+import hashlib
+import io
+import json
+import os
+import shlex
+import tarfile
+import time
+
+from django.conf import settings
+
+# Directories of the workspace of a server profile, the file types of UploadBatch.add are
+# indexes of this list
+WORKSPACE_DIRS = ['Keywords', 'Libraries', 'Profiles', 'Resources', 'Templates', 'TestScripts', 'Tools',
+                  'TestSuites', 'Results']
+
+# Directories known to exist by (host, port, user), kept for the life of the worker process
+known_dirs = dict()
+
+# Manifest of the keyword resources in the Keywords directory, {file name: last time used}
+MANIFEST_NAME = '.manifest.json'
+
+
+def workspace_key(config):
+    """
+    workspace_key(config) -> (host, port, user)
+    """
+    return config.get('host'), int(config.get('port') or 22), config.get('user')
+
+
+def resource_name(name, content):
+    """
+    resource_name(name, content) -> NAME_<digest>
+
+    Name of the keyword resource <name> given by the digest of its <content>, the same script
+    gets the same name in every run so it is only uploaded once per host
+    """
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+    return '{0}_{1}'.format(name.replace(" ", ""), digest)
+
+
+def load_manifest(data):
+    """
+    load_manifest(data) -> dictionary
+
+    Manifest of the bytes <data>, an empty one when it is missing or corrupted
+    """
+    try:
+        manifest = json.loads(data.decode('utf-8'))
+    except ValueError:
+        return dict()
+    if not isinstance(manifest, dict):
+        return dict()
+    return manifest
+
+
+def prune_manifest(manifest, size, keep=()):
+    """
+    prune_manifest(manifest, size, keep=()) -> list of the names removed
+
+    Remove the least recently used names of <manifest> until it has <size> entries, the names
+    in <keep> are never removed
+    """
+    names = sorted((name for name in manifest if name not in keep), key=lambda name: manifest[name])
+    removed = names[:max(0, len(manifest) - size)]
+    for name in removed:
+        del manifest[name]
+    return removed
+
+
+def prepare_workspace(sftp, config):
+    """
+    prepare_workspace(sftp, config)
+
+    Create the WORKSPACE_DIRS missing under the "path" of <config>, the directories known to
+    exist in the host are not checked again
+    """
+    path = config.get('path')
+    known = known_dirs.setdefault(workspace_key(config), set())
+    for directory in WORKSPACE_DIRS:
+        remote = '{0}/{1}'.format(path, directory)
+        if remote in known:
+            continue
+        try:
+            sftp.stat(remote)
+        except IOError:
+            try:
+                sftp.mkdir(remote)
+            except IOError:
+                raise Exception("Destination directory does not exist, you don't have write permission. "
+                                "Or can't connect to server")
+        known.add(remote)
+
+
+def run_remote(client, command, data=None):
+    """
+    run_remote(client, command, data=None) -> stdout bytes
+
+    Run <command> in the host of <client> writing <data> to its stdin, raises an Exception
+    with its stderr when it fails
+    """
+    stdin, stdout, stderr = client.exec_command(command)
+    if data is not None:
+        stdin.write(data)
+    stdin.channel.shutdown_write()
+    output = stdout.read()
+    if stdout.channel.recv_exit_status() != 0:
+        raise Exception("Command failed in the server: {0}".format(
+            stderr.read().decode('utf-8', errors='replace').strip()))
+    return output
+
+
+def fetch_results(client, config, names, destination):
+    """
+    fetch_results(client, config, names, destination)
+
+    Get the files <names> of the Results directory of the workspace in a single compressed
+    tar stream and write them in the local <destination> directory
+    """
+    command = 'cd {0} && tar czf - {1}'.format(
+        shlex.quote('{0}/Results'.format(config.get('path'))), ' '.join(shlex.quote(name) for name in names))
+    with tarfile.open(fileobj=io.BytesIO(run_remote(client, command)), mode='r:gz') as archive:
+        for member in archive.getmembers():
+            # Nothing but the requested files is written
+            if member.isfile() and member.name in names:
+                with archive.extractfile(member) as source, \
+                        open(os.path.join(destination, member.name), 'wb') as target:
+                    target.write(source.read())
+
+
+class BatchFile(io.StringIO):
+    """
+    File of a run on server written in memory, its content is queued in the UploadBatch when
+    it is closed
+    """
+
+    def __init__(self, batch, name, file_type, cached=False):
+        io.StringIO.__init__(self)
+        self.batch = batch
+        self.name = name
+        self.file_type = file_type
+        self.cached = cached
+
+    def close(self):
+        """
+        close(self)
+        """
+        if not self.closed:
+            self.batch.add(self.name, self.file_type, self.getvalue(), cached=self.cached)
+        io.StringIO.close(self)
+
+
+class UploadBatch:
+    """
+    Files of a run on server sent together: the workspace is prepared once and all the files
+    go through a single SFTP session with pipelined writes or, for latency bound links, in a
+    single compressed tar stream unpacked by one remote command.
+
+    The files are generated in memory, nothing is written in the local disk. The cached files,
+    keyword resources named with resource_name, are only sent when they are not in the
+    manifest of the Keywords directory of the host
+    """
+
+    def __init__(self, client, config, archive=None):
+        """
+        __init__(self, client, config, archive=None)
+
+        <client> is a connected paramiko.SSHClient and <config> the connection config of the
+        server profile, with its "path". The files are sent as a tar stream when <archive>
+        (settings.CTA_WORKSPACE_ARCHIVE by default) is True
+        """
+        self.client = client
+        self.config = config
+        self.archive = settings.CTA_WORKSPACE_ARCHIVE if archive is None else archive
+        self.files = []
+        self.stats = {'sent': 0, 'cached': 0, 'pruned': 0}
+
+    def open(self, name, file_type, cached=False):
+        """
+        open(self, name, file_type, cached=False) -> BatchFile
+
+        In memory file to write the content of <name>, it is queued when it is closed
+        """
+        return BatchFile(self, name, file_type, cached=cached)
+
+    def add(self, name, file_type, content, cached=False):
+        """
+        add(self, name, file_type, content, cached=False)
+
+        Queue <content> to be sent as <name> to the directory WORKSPACE_DIRS[<file_type>], a
+        name already queued for the same directory is sent once. A <cached> file is skipped
+        when the manifest of the host already has it
+        """
+        if not any(queued[:2] == (name, file_type) for queued in self.files):
+            self.files.append((name, file_type, content.encode('utf-8'), cached))
+
+    def send(self):
+        """
+        send(self)
+
+        Send all the queued files, the cache of known directories of the host is dropped and
+        the workspace prepared again when a file can not be written
+        """
+        if not self.files:
+            return
+        if self.archive:
+            self._send_archive()
+        else:
+            sftp = self.client.open_sftp()
+            try:
+                try:
+                    self._send(sftp)
+                except IOError:
+                    # Some directory was removed in the server since it was cached
+                    known_dirs.pop(workspace_key(self.config), None)
+                    self._send(sftp)
+            finally:
+                sftp.close()
+        self.files = []
+
+    def _plan(self, manifest):
+        """
+        _plan(self, manifest) -> (files to send, names pruned)
+
+        Skip the cached files that are in <manifest>, mark all of them as used now and prune
+        the manifest to settings.CTA_RESOURCE_CACHE_SIZE entries
+        """
+        now = time.time()
+        files = []
+        used = set()
+        for (name, file_type, content, cached) in self.files:
+            if cached:
+                used.add(name)
+                present = name in manifest
+                manifest[name] = now
+                if present:
+                    continue
+            files.append((name, file_type, content))
+        pruned = prune_manifest(manifest, settings.CTA_RESOURCE_CACHE_SIZE, keep=used)
+        self.stats = {'sent': len(files), 'cached': len(self.files) - len(files), 'pruned': len(pruned)}
+        return files, pruned
+
+    def _has_cached(self):
+        return any(queued[3] for queued in self.files)
+
+    def _send(self, sftp):
+        prepare_workspace(sftp, self.config)
+        path = self.config.get('path')
+        keywords = '{0}/{1}'.format(path, WORKSPACE_DIRS[0])
+        manifest = None
+        if self._has_cached():
+            try:
+                with sftp.open('{0}/{1}'.format(keywords, MANIFEST_NAME)) as remote_file:
+                    manifest = load_manifest(remote_file.read())
+            except IOError:
+                manifest = dict()
+            files, pruned = self._plan(manifest)
+        else:
+            files, pruned = [queued[:3] for queued in self.files], []
+            self.stats = {'sent': len(files), 'cached': 0, 'pruned': 0}
+        for (name, file_type, content) in files:
+            remote = '{0}/{1}/{2}'.format(path, WORKSPACE_DIRS[file_type], name)
+            # Without confirm the writes are not followed by a stat of the file
+            sftp.putfo(io.BytesIO(content), remote, confirm=False)
+        for name in pruned:
+            try:
+                sftp.remove('{0}/{1}'.format(keywords, name))
+            except IOError:
+                pass
+        if manifest is not None:
+            # Written aside and renamed, a run reading it never finds half a manifest
+            temporary = '{0}/{1}.{2}'.format(keywords, MANIFEST_NAME, os.getpid())
+            sftp.putfo(io.BytesIO(json.dumps(manifest).encode('utf-8')), temporary, confirm=False)
+            sftp.posix_rename(temporary, '{0}/{1}'.format(keywords, MANIFEST_NAME))
+
+    def _send_archive(self):
+        """
+        _send_archive(self)
+
+        Pack the queued files in a compressed tar with the layout of the workspace, the remote
+        command creates the WORKSPACE_DIRS and unpacks it reading stdin. With cached files the
+        manifest is read first, the new one goes in the tar and the pruned resources are
+        removed by the same command
+        """
+        path = shlex.quote(self.config.get('path'))
+        manifest_path = '{0}/{1}'.format(WORKSPACE_DIRS[0], MANIFEST_NAME)
+        files, pruned = [queued[:3] for queued in self.files], []
+        self.stats = {'sent': len(files), 'cached': 0, 'pruned': 0}
+        if self._has_cached():
+            manifest = load_manifest(run_remote(
+                self.client, 'cat {0}/{1} 2>/dev/null || true'.format(path, manifest_path)))
+            files, pruned = self._plan(manifest)
+            files.append((MANIFEST_NAME, 0, json.dumps(manifest).encode('utf-8')))
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode='w:gz') as archive:
+            for (name, file_type, content) in files:
+                info = tarfile.TarInfo('{0}/{1}'.format(WORKSPACE_DIRS[file_type], name))
+                info.size = len(content)
+                info.mtime = time.time()
+                info.mode = 0o644
+                archive.addfile(info, io.BytesIO(content))
+        command = 'cd {0} && mkdir -p {1} && tar xzf -'.format(path, ' '.join(WORKSPACE_DIRS))
+        if pruned:
+            command += ' && rm -f {0}'.format(' '.join(
+                shlex.quote('{0}/{1}'.format(WORKSPACE_DIRS[0], name)) for name in pruned))
+        run_remote(self.client, command, data.getvalue())
+        known_dirs.setdefault(workspace_key(self.config), set()).update(
+            '{0}/{1}'.format(self.config.get('path'), directory) for directory in WORKSPACE_DIRS)
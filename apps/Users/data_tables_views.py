@@ -69,5 +69,11 @@ class TasksListJson(LoginRequiredMixin, BaseDatatableView):
             return '{}'.format(row.created_at.strftime("%d/%b/%Y - %H:%M"))
         if column == 'updated_at':
             return '{}'.format(row.updated_at.strftime("%d/%b/%Y - %H:%M"))
+        if column == 'state' and row.category == 1 and row.state in ('PENDING', 'PROGRESS'):
+            # Running extracts show the progress they publish
+            row.update_progress()
+            if row.get_progress():
+                return '{0}: {1}'.format(row.state, row.progress_summary())
+            return '{}'.format(row.state)
         else:
             return super(TasksListJson, self).render_column(row, column)
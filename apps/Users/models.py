@@ -1,4 +1,6 @@
 import json
+from datetime import timedelta
+from celery import states
 from celery.result import AsyncResult
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin
@@ -39,6 +41,76 @@ class Task(models.Model):
         self.updated_at = timezone.now()
         return super(Task, self).save(*args, **kwargs)
 
+    def update_progress(self, res=None):
+        """Keep the progress published by a running extract (check extracts.ExtractProgress),
+        the task is only saved when its state or progress changed"""
+        if self.category != 1:
+            return
+        res = res or AsyncResult(self.task_id)
+        if res.state == 'PROGRESS' and isinstance(res.info, dict):
+            info = res.info
+            if info.get('shards'):
+                info = self.shards_progress(info)
+            task_info = json.dumps(info)
+            if self.state != res.state or self.task_info != task_info:
+                self.state = res.state
+                self.task_info = task_info
+                self.save()
+
+    @staticmethod
+    def shards_progress(info):
+        """Add up the progress the shards of a sharded extract publish under their own ids,
+        <info> is the progress of the extract with the commands of every shard"""
+        done = 0
+        rate = 0.0
+        elapsed = info.get('elapsed') or 0
+        for (task_id, commands) in info['shards'].items():
+            res = AsyncResult(task_id)
+            if res.ready():
+                done += commands
+            elif res.state == 'PROGRESS' and isinstance(res.info, dict):
+                if res.info.get('phase') == 'persist':
+                    done += commands
+                elif res.info.get('phase') == 'parse':
+                    done += min(res.info.get('done') or 0, commands)
+                # The shards run at the same time
+                rate += res.info.get('pages_per_second') or 0
+                elapsed = max(elapsed, res.info.get('elapsed') or 0)
+        total = info.get('total')
+        progress = dict(info, phase='parse', done=done, pages_per_second=round(rate, 2), elapsed=elapsed)
+        del progress['shards']
+        if total:
+            progress['percent'] = round(100.0 * done / total, 1)
+            progress['eta'] = round(max(total - done, 0) / rate) if rate > 0 else None
+        return progress
+
+    def get_progress(self):
+        """Return the progress dictionary of a running extract or None"""
+        if self.state != 'PROGRESS':
+            return None
+        info = self.task_info
+        if not isinstance(info, dict):
+            try:
+                info = json.loads(info)
+            except ValueError:
+                return None
+        return info if isinstance(info, dict) else None
+
+    def progress_summary(self):
+        """Return the progress of a running extract as text, for example:
+        "parse 1200/4000 (30.0%) - 41.5 pages/s - ETA 1:07:26"
+        """
+        progress = self.get_progress()
+        if progress is None:
+            return ''
+        summary = "{0} {1}".format(progress.get('phase'), progress.get('done'))
+        if progress.get('total'):
+            summary += "/{0} ({1}%)".format(progress['total'], progress.get('percent'))
+        summary += " - {0} pages/s".format(progress.get('pages_per_second'))
+        if progress.get('eta') is not None:
+            summary += " - ETA {0}".format(timedelta(seconds=progress['eta']))
+        return summary
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """The AbstractBaseUser is used because we need authentication with email.
@@ -81,7 +153,10 @@ class User(AbstractBaseUser, PermissionsMixin):
         user_tasks = []
         for task in self.tasks.all().order_by('-created_at')[:6]:
             res = AsyncResult(task.task_id)
-            if res.ready() and res.state != task.state:
+            if task.state in states.READY_STATES:
+                # Finished tasks keep the state they were given, like the failure of an extract
+                pass
+            elif res.ready() and res.state != task.state:
                 if task.category is 1:
                     task.state = res.state
                     task.task_info = res.result or ''
@@ -98,7 +173,9 @@ class User(AbstractBaseUser, PermissionsMixin):
                         task.state = 'FAILURE'
                         task.task_info = "Celery or Message broker stopped"
                 task.save()
-            
+            elif not res.ready():
+                task.update_progress(res)
+
             if task.category is 1:
                 try:
                     task.task_info = json.loads(task.task_info)
@@ -1,4 +1,5 @@
 import json
+import os
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -256,15 +257,30 @@ class RunExtract(LoginRequiredMixin, APIView):
         stepper = request.data.get('stepper')
         data = {}
         try:
-            file = request.FILES.get('zip')
-            if file:
-                fs = FileSystemStorage(location='{0}/zip/'.format(settings.MEDIA_ROOT))
-                filename = fs.save(file.name, file)
-                uploaded_file_url = fs.url('zip/{}'.format(filename))
-                _config.update({"zip": uploaded_file_url})
+            # Robot Framework zip, libdoc spec, man pages archive and "compgen -c" output of the extracts
+            for (key, directory) in (('zip', 'zip'), ('spec', 'specs'), ('archive', 'archives'),
+                                     ('compgen', 'archives')):
+                file = request.FILES.get(key)
+                if file:
+                    fs = FileSystemStorage(location='{0}/{1}/'.format(settings.MEDIA_ROOT, directory))
+                    filename = fs.save(file.name, file)
+                    uploaded_file_url = fs.url('{0}/{1}'.format(directory, filename))
+                    _config.update({key: uploaded_file_url})
             origin = 'Local Server'
             if _config.get('host'):
                 origin = _config.get('host')
+            elif _config.get('archive'):
+                origin = 'archive {0}'.format(os.path.basename(_config.get('archive')))
+            if hasattr(_config, 'getlist') and _config.getlist('profiles'):
+                # Form data, the list of profiles would be lost with the rest of the values
+                profiles = _config.getlist('profiles')
+                _config = _config.dict()
+                _config['profiles'] = profiles
+            hosts = _config.get('hosts') or _config.get('profiles')
+            if isinstance(hosts, list):
+                origin = '{0} hosts'.format(len(hosts))
+            # Internal flag of the extracts, the regular expression of the user is always checked
+            _config.pop('regex_checked', None)
             extract = run_extract.delay(_config)
             task = Task.objects.create(
                 name="Extract commands from {0}".format(origin),
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the man page parser of extracts.py
+
+Compares the throughput in pages per second of the single pass tokenizer (tokenize_manpage)
+against the re.split parser (_parse_sections and _parse_arguments) and checks both of them
+give the same sections and arguments for every page
+
+Usage:
+    python benchmarks/bench_man_parser.py                   - recorded man pages of benchmarks/corpus/man
+    python benchmarks/bench_man_parser.py --corpus DIR      - rendered man pages stored in DIR
+    python benchmarks/bench_man_parser.py --local           - man pages of the local commands, rendered
+                                                              with man
+    python benchmarks/bench_man_parser.py --source ID       - man pages stored for a Source
+"""
+import argparse
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+from common import MAN_CORPUS_DIR, load_man_corpus, quiet, setup_django
+
+
+def load_local(limit):
+    """
+    load_local(limit) -> {command: man page text}
+
+    Render the man pages of the commands available in the local environment
+    """
+    if not shutil.which('man'):
+        sys.exit("man is not installed, install man-db or use the recorded pages of --corpus")
+    commands = subprocess.run(['bash', '-c', 'compgen -c | sort -u'], stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout.split()
+    pages = dict()
+    for command in commands:
+        if len(pages) >= limit:
+            break
+        man = subprocess.run(['man', '-L', 'en', command], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             universal_newlines=True).stdout
+        if man.strip():
+            pages[command] = man
+    return pages
+
+
+def load_source(source_id, limit):
+    """
+    load_source(source_id, limit) -> {command: man page text}
+
+    Read the man pages stored in the corpus of a Source
+    """
+    from extracts import ManCorpus
+    from apps.Products.models import Source
+    corpus = ManCorpus(Source.objects.get(pk=source_id))
+    pages = dict()
+    for command in sorted(corpus.index)[:limit]:
+        text = corpus.get(command)
+        if text is not None:
+            pages[command] = text
+    return pages
+
+
+def legacy_parse(extract, text, command):
+    from extracts import ARGUMENTS_SECTIONS
+    extract._parse_sections(re.split(extract.sections_re, text), command)
+    for section in ARGUMENTS_SECTIONS:
+        extract._parse_arguments(section, command)
+    return dict(extract.sections_dict), dict(extract.arguments_dict)
+
+
+def tokenizer_parse(extract, text, command):
+    extract._parse_manpage(text, command)
+    return dict(extract.sections_dict), dict(extract.arguments_dict)
+
+
+def bench(parser, extract, pages, rounds):
+    """
+    bench(parser, extract, pages, rounds) -> (pages per second, {command: result})
+
+    Best of <rounds> runs of <parser> over all the <pages>
+    """
+    best = None
+    results = dict()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for (command, text) in pages.items():
+            results[command] = parser(extract, text, command)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(pages) / best if best else 0.0, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=MAN_CORPUS_DIR,
+                        help="directory with rendered man pages, benchmarks/corpus/man by default")
+    parser.add_argument('--local', action='store_true', help="render the man pages of the local commands")
+    parser.add_argument('--source', type=int, help="id of a Source with stored man pages")
+    parser.add_argument('--limit', type=int, default=1000, help="maximum number of pages")
+    parser.add_argument('--rounds', type=int, default=5, help="runs of every parser, the best one is reported")
+    args = parser.parse_args()
+
+    # The stored corpus of a Source needs the settings and the database of the project
+    setup_django(project=bool(args.source))
+    from extracts import MExtract
+
+    if args.source:
+        pages = load_source(args.source, args.limit)
+    elif args.local:
+        pages = load_local(args.limit)
+    else:
+        pages = load_man_corpus(args.corpus, args.limit)
+        if not pages:
+            sys.exit("No man pages in {0}, record them with benchmarks/record_corpus.py --man in a "
+                     "host with man-db or render the local ones with --local".format(args.corpus))
+    if not pages:
+        print("No man pages found")
+        return 1
+
+    extract = MExtract(api_config={'workers': 1})
+    extract._setup_regex()
+    extract.initial_time = time.time()
+    # The parsers print every command they are working in
+    with quiet():
+        legacy_rate, legacy_results = bench(legacy_parse, extract, pages, args.rounds)
+        tokenizer_rate, tokenizer_results = bench(tokenizer_parse, extract, pages, args.rounds)
+
+    agree = sum(1 for command in pages if legacy_results[command] == tokenizer_results[command])
+    size = sum(len(text) for text in pages.values())
+    print("pages:      {0} ({1:.1f} KiB)".format(len(pages), size / 1024))
+    print("re.split:   {0:10.1f} pages/s".format(legacy_rate))
+    print("tokenizer:  {0:10.1f} pages/s ({1:.2f}x)".format(tokenizer_rate, tokenizer_rate / legacy_rate))
+    print("same result: {0}/{1}".format(agree, len(pages)))
+    return 0 if agree == len(pages) else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
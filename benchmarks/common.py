@@ -0,0 +1,118 @@
+"""
+Helpers shared by the benchmarks: django setup without a database and the corpus loaders
+"""
+import contextlib
+import gzip
+import os
+import sys
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+CORPUS_DIR = os.path.join(BENCHMARKS_DIR, 'corpus')
+MAN_CORPUS_DIR = os.path.join(CORPUS_DIR, 'man')
+LIBDOC_CORPUS_DIR = os.path.join(CORPUS_DIR, 'libdoc')
+
+# Settings used by the extracts, the same values than CTAFramework/settings.py except the
+# ones of the corpus of the Sources. The database is never queried by the benchmarks
+BENCHMARK_SETTINGS = {
+    'INSTALLED_APPS': ['django.contrib.contenttypes', 'django.contrib.auth', 'apps.Products'],
+    'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    'USE_I18N': False,
+    'MEDIA_ROOT': tempfile.gettempdir(),
+    'CTA_MAN_COMMAND': 'man -L en',
+    'CTA_MAN_NATIVE_READER': False,
+    'CTA_EXTRACT_WORKERS': 1,
+    'CTA_SSH_HARVEST': True,
+    'CTA_SSH_HARVEST_TIMEOUT': 600,
+    'CTA_EXTRACT_BATCH_SIZE': 500,
+    'CTA_EXTRACT_PROGRESS_INTERVAL': 2,
+    'CTA_EXTRACT_SHARD_SIZE': 500,
+    'CTA_EXTRACT_HOST_CONCURRENCY': 8,
+    'CTA_REGEX_CHECK_BUDGET': 5,
+    'CTA_REGEX_SAMPLE_PAGES': 50,
+    'CTA_REGEX_PAGE_TIMEOUT': 10,
+    'CTA_CHECKPOINT_MAX_AGE': 7,
+    'CTA_CORPUS': False,
+    'CTA_CORPUS_ROOT': os.path.join(tempfile.gettempdir(), 'corpus'),
+    'CTA_CORPUS_MAX_AGE': 90,
+    'CTA_CORPUS_MAX_SIZE': 2 * 1024 * 1024 * 1024,
+}
+
+
+def setup_django(project=False):
+    """
+    setup_django(project=False)
+
+    Configure django with BENCHMARK_SETTINGS, or with the settings of the project when
+    <project> is True (it needs secrets.json and the database)
+    """
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    import django
+    from django.conf import settings
+    if project:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "CTAFramework.settings")
+    elif not settings.configured:
+        settings.configure(**BENCHMARK_SETTINGS)
+    django.setup()
+
+
+class NullWriter:
+    """
+    NullWriter
+
+    Stand-in of extracts.BulkWriter that just counts the rows, so the benchmarks do not
+    measure the database
+    """
+    def __init__(self):
+        self.commands = 0
+        self.arguments = 0
+
+    def add(self, source, name, description, arguments, label=None, fingerprint=None):
+        self.commands += 1
+        self.arguments += len(arguments)
+
+    def flush(self):
+        pass
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Hide the prints of the extracts while the benchmarks run
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def read_text(path):
+    """
+    read_text(path) -> text of a plain or gzip file
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as page:
+        return page.read()
+
+
+def load_man_corpus(path=MAN_CORPUS_DIR, limit=None):
+    """
+    load_man_corpus(path=MAN_CORPUS_DIR, limit=None) -> {command: man page text}
+
+    Read the rendered man pages of a directory, the name of every file is the command
+    """
+    pages = dict()
+    if not os.path.isdir(path):
+        return pages
+    names = [name for name in sorted(os.listdir(path)) if '.txt' in name]
+    for name in names[:limit]:
+        command = name.split('.txt')[0]
+        pages[command] = read_text(os.path.join(path, name))
+    return pages
+
+
+def libdoc_paths(path=LIBDOC_CORPUS_DIR):
+    """
+    libdoc_paths(path=LIBDOC_CORPUS_DIR) -> list of the libdoc pages of a directory
+    """
+    return [os.path.join(path, name) for name in sorted(os.listdir(path)) if '.html' in name]
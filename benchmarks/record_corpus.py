@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Record the corpus of the benchmarks
+
+The man pages are written by "man | col -b", so man and col must be installed: the corpus
+checks the parsers and the in-process reader of apps/Products/man_reader.py against what
+the hosts give. The libdoc pages are generated with robot.libdoc, so Robot Framework must
+be installed to record them
+
+Usage:
+    python benchmarks/record_corpus.py                  - default commands and libraries
+    python benchmarks/record_corpus.py --man ls cp      - just the man pages of ls and cp
+"""
+import argparse
+import gzip
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import MAN_CORPUS_DIR, LIBDOC_CORPUS_DIR
+
+COMMANDS = [
+    'apt-get', 'awk', 'chmod', 'chown', 'cp', 'cut', 'date', 'df', 'diff', 'dpkg', 'du', 'env',
+    'find', 'git', 'grep', 'gzip', 'head', 'ip', 'journalctl', 'kill', 'less', 'ln', 'ls', 'make',
+    'mkdir', 'mv', 'nice', 'openssl', 'patch', 'perl', 'ps', 'python3', 'readlink', 'rm', 'sed',
+    'sort', 'ss', 'stat', 'tail', 'tar', 'tee', 'timeout', 'touch', 'tr', 'uniq', 'unzip', 'watch',
+    'wc', 'xargs',
+]
+LIBRARIES = ['Collections', 'DateTime', 'OperatingSystem', 'String']
+
+
+def write_gzip(path, data):
+    # mtime=0 keeps the files the same when the pages did not change
+    with open(path, 'wb') as output, gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as compressed:
+        compressed.write(data)
+
+
+def record_man(commands):
+    if not shutil.which('man') or not shutil.which('col'):
+        sys.exit("man and col are needed to record the man pages, install man-db and bsdextrautils")
+    # The same width in every host, man uses the one of the terminal
+    environment = dict(os.environ, MANWIDTH='80')
+    for command in commands:
+        man = subprocess.run("man -L en {0} | col -b".format(shlex.quote(command)), shell=True, env=environment,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             universal_newlines=True).stdout
+        if not man.strip():
+            print("No man page for {0}".format(command))
+            continue
+        write_gzip(os.path.join(MAN_CORPUS_DIR, command + '.txt.gz'), man.encode('utf-8'))
+        print("Recorded {0}".format(command))
+
+
+def record_libdoc(libraries):
+    try:
+        from robot.libdoc import libdoc
+    except ImportError:
+        print("Robot Framework is not installed, the libdoc pages were not recorded")
+        return
+    directory = tempfile.mkdtemp()
+    try:
+        for library in libraries:
+            path = os.path.join(directory, library + '.html')
+            libdoc(library, path)
+            with open(path, 'rb') as page:
+                write_gzip(os.path.join(LIBDOC_CORPUS_DIR, library + '.html.gz'), page.read())
+            print("Recorded {0}".format(library))
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--man', nargs='*', help="commands whose man pages are recorded")
+    parser.add_argument('--libdoc', nargs='*', help="Robot Framework libraries that are recorded")
+    args = parser.parse_args()
+    everything = args.man is None and args.libdoc is None
+    os.makedirs(MAN_CORPUS_DIR, exist_ok=True)
+    os.makedirs(LIBDOC_CORPUS_DIR, exist_ok=True)
+    if everything or args.man is not None:
+        record_man(args.man or COMMANDS)
+    if everything or args.libdoc is not None:
+        record_libdoc(args.libdoc or LIBRARIES)
+
+
+if __name__ == '__main__':
+    main()
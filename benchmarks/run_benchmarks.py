@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""
+Benchmark suite of the extraction parsers
+
+Runs the man page parser of MExtract (and PExtract, which uses the same one) over the
+recorded man pages of benchmarks/corpus/man and over synthetic pages of growing size, and
+the libdoc parser of RExtract over the recorded pages of benchmarks/corpus/libdoc. The
+database is replaced by a writer that only counts the rows.
+
+Every suite reports pages per second, the seconds spent in every stage and the peak memory,
+the results are written as JSON so they can be compared between releases
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --tolerance 0.15
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from common import (ROOT_DIR, NullWriter, libdoc_paths, load_man_corpus, quiet, read_text,
+                    setup_django)
+from synthetic import generate_corpus
+
+setup_django()
+
+from extracts import ARGUMENTS_SECTIONS, MExtract, _digest, keyword_record, read_libdoc
+
+# (pages, options per page) of the synthetic suites
+SYNTHETIC_SCALES = [(200, 10), (50, 100), (10, 1000)]
+
+
+def _new_extract():
+    extract = MExtract(api_config={'workers': 1})
+    extract._setup_regex()
+    extract.writer = NullWriter()
+    extract.source = None
+    return extract
+
+
+def man_pass(pages, stages=None):
+    """
+    man_pass(pages, stages=None) -> NullWriter
+
+    Fingerprint, parse and save every page the same way than MExtract._process_manpage and
+    _save_record, adding the seconds of every stage to <stages>
+    """
+    extract = _new_extract()
+    clock = time.perf_counter
+    for (command, text) in pages.items():
+        start = clock()
+        digest = _digest(text)
+        fingerprint = extract._fingerprint(digest)
+        fingerprinted = clock()
+        record = extract._parse_manpage(text, command)
+        record['digest'] = digest
+        record['fingerprint'] = fingerprint
+        parsed = clock()
+        extract._save_record(record)
+        saved = clock()
+        if stages is not None:
+            stages['fingerprint'] += fingerprinted - start
+            stages['parse'] += parsed - fingerprinted
+            stages['persist'] += saved - parsed
+    return extract.writer
+
+
+def legacy_pass(pages):
+    """
+    legacy_pass(pages)
+
+    Parse every page splitting it with re.split, as MExtract did before tokenize_manpage
+    """
+    extract = _new_extract()
+    for (command, text) in pages.items():
+        extract._parse_sections(re.split(extract.sections_re, text), command)
+        for section in ARGUMENTS_SECTIONS:
+            extract._parse_arguments(section, command)
+
+
+def libdoc_pass(libraries, stages=None):
+    """
+    libdoc_pass(libraries, stages=None) -> number of keywords
+
+    Decode the libdoc of every library and build its records the same way than parse_library
+    """
+    clock = time.perf_counter
+    keywords = 0
+    for lib in libraries:
+        start = clock()
+        with zipfile.ZipFile(lib['zip']) as robot_zip, robot_zip.open(lib['path']) as page:
+            decoded_keywords = list(read_libdoc(page))
+        decoded = clock()
+        records = [keyword_record(keyword) for keyword in decoded_keywords]
+        built = clock()
+        keywords += len(records)
+        if stages is not None:
+            stages['decode'] += decoded - start
+            stages['records'] += built - decoded
+    return keywords
+
+
+def measure(function, rounds, stage_names):
+    """
+    measure(function, rounds, stage_names) -> (best seconds, stages of the best round, peak KiB, result)
+
+    Best of <rounds> runs of <function>, the peak memory is measured in an extra run because
+    tracemalloc slows down the code
+    """
+    best = None
+    best_stages = None
+    result = None
+    for _ in range(rounds):
+        stages = dict.fromkeys(stage_names, 0.0)
+        start = time.perf_counter()
+        result = function(stages)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+            best_stages = stages
+    tracemalloc.start()
+    try:
+        function(None)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, best_stages, peak // 1024, result
+
+
+def man_suite(name, pages, rounds):
+    with quiet():
+        seconds, stages, peak, writer = measure(lambda stages: man_pass(pages, stages), rounds,
+                                                ('fingerprint', 'parse', 'persist'))
+        legacy, _, _, _ = measure(lambda stages: legacy_pass(pages), rounds, ())
+    return {
+        'suite': name,
+        'pages': len(pages),
+        'bytes': sum(len(text.encode('utf-8')) for text in pages.values()),
+        'commands': writer.commands,
+        'arguments': writer.arguments,
+        'seconds': round(seconds, 6),
+        'pages_per_second': round(len(pages) / seconds, 2),
+        'stages': {stage: round(value, 6) for (stage, value) in stages.items()},
+        'peak_memory_kib': peak,
+        'legacy_pages_per_second': round(len(pages) / legacy, 2),
+    }
+
+
+def libdoc_suite(paths, rounds):
+    # RExtract reads the libraries from the zip of the Robot Framework docs
+    directory = tempfile.mkdtemp()
+    zip_path = os.path.join(directory, 'robotframework.zip')
+    size = 0
+    libraries = []
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as robot_zip:
+        for path in paths:
+            name = os.path.basename(path).split('.')[0]
+            data = read_text(path).encode('utf-8')
+            size += len(data)
+            member = 'robotframework/libraries/{0}.html'.format(name)
+            robot_zip.writestr(member, data)
+            libraries.append({'name': name, 'zip': zip_path, 'path': member})
+    try:
+        with quiet():
+            seconds, stages, peak, keywords = measure(lambda stages: libdoc_pass(libraries, stages), rounds,
+                                                      ('decode', 'records'))
+    finally:
+        os.remove(zip_path)
+        os.rmdir(directory)
+    return {
+        'suite': 'libdoc',
+        'pages': len(libraries),
+        'bytes': size,
+        'keywords': keywords,
+        'seconds': round(seconds, 6),
+        'pages_per_second': round(len(libraries) / seconds, 2),
+        'keywords_per_second': round(keywords / seconds, 2),
+        'stages': {stage: round(value, 6) for (stage, value) in stages.items()},
+        'peak_memory_kib': peak,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'date': datetime.datetime.utcnow().isoformat() + 'Z',
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    compare(results, baseline, tolerance) -> list of regressions
+
+    A suite regresses when its pages per second drop more than <tolerance> (0.15 is 15%)
+    """
+    regressions = []
+    previous = {suite['suite']: suite for suite in baseline.get('suites', [])}
+    for suite in results['suites']:
+        before = previous.get(suite['suite'])
+        if not before or not before.get('pages_per_second'):
+            continue
+        change = suite['pages_per_second'] / before['pages_per_second'] - 1
+        if change < -tolerance:
+            regressions.append("{0}: {1} -> {2} pages/s ({3:+.1%})".format(
+                suite['suite'], before['pages_per_second'], suite['pages_per_second'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="file where the JSON results are written")
+    parser.add_argument('--rounds', type=int, default=3, help="runs of every suite, the best one is reported")
+    parser.add_argument('--suite', action='append', choices=['man', 'synthetic', 'libdoc'],
+                        help="suites to run, all of them by default")
+    parser.add_argument('--compare', help="JSON results of a previous run")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="drop of pages per second reported as a regression")
+    args = parser.parse_args()
+    suites = args.suite or ['man', 'synthetic', 'libdoc']
+
+    results = {'environment': environment(), 'rounds': args.rounds, 'suites': []}
+    if 'man' in suites:
+        pages = load_man_corpus()
+        if pages:
+            results['suites'].append(man_suite('man', pages, args.rounds))
+        else:
+            print("No recorded man pages, record them with benchmarks/record_corpus.py", file=sys.stderr)
+    if 'synthetic' in suites:
+        for (pages, options) in SYNTHETIC_SCALES:
+            corpus = generate_corpus(pages, options)
+            results['suites'].append(man_suite('synthetic-{0}'.format(options), corpus, args.rounds))
+    if 'libdoc' in suites:
+        results['suites'].append(libdoc_suite(libdoc_paths(), args.rounds))
+
+    for suite in results['suites']:
+        print("{0:<16} {1:>5} pages {2:>10.1f} pages/s  peak {3:>7} KiB  {4}".format(
+            suite['suite'], suite['pages'], suite['pages_per_second'], suite['peak_memory_kib'],
+            ' '.join("{0}={1:.4f}s".format(stage, value) for (stage, value) in suite['stages'].items())))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            results_file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("Regression in {0}".format(regression))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Synthetic man pages, with the layout of the man pages of GNU coreutils and any number of
+options, used to measure how the parsers scale with the size of the pages
+"""
+import random
+
+WORDS = (
+    "file directory output input print list show set use when the of a to and or not with "
+    "default value each all only for from this that mode size time name line number format "
+    "entries links recursively ignore follow symbolic force interactive verbose quiet"
+).split()
+
+
+def _sentence(rng, words):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _paragraph(rng, sentences, indent):
+    """
+    _paragraph(rng, sentences, indent) -> text filled to 78 columns
+    """
+    words = ' '.join(_sentence(rng, rng.randint(6, 16)) for _ in range(sentences)).split()
+    lines = []
+    line = ''
+    for word in words:
+        if line and len(indent) + len(line) + 1 + len(word) > 78:
+            lines.append(indent + line)
+            line = word
+        else:
+            line = word if not line else line + ' ' + word
+    if line:
+        lines.append(indent + line)
+    return '\n'.join(lines)
+
+
+def generate_page(command, options, seed=0):
+    """
+    generate_page(command, options, seed=0) -> man page text
+
+    Man page of <command> with <options> options in the DESCRIPTION section, half of them
+    with a short and a long name and a third of them with a value
+    """
+    rng = random.Random("{0}-{1}-{2}".format(command, options, seed))
+    parts = [
+        "NAME",
+        "       {0} - {1}".format(command, _sentence(rng, 5)[:-1].lower()),
+        "",
+        "SYNOPSIS",
+        "       {0} [OPTION]... [FILE]...".format(command),
+        "",
+        "DESCRIPTION",
+        _paragraph(rng, 3, "       "),
+        "",
+    ]
+    for number in range(options):
+        long_name = "--{0}-{1}".format(rng.choice(WORDS), number)
+        if number % 3 == 0:
+            long_name += "=" + rng.choice(WORDS).upper()
+        if number % 2 == 0:
+            header = "       -{0}, {1}".format(chr(ord('a') + number % 26), long_name)
+        else:
+            header = "       {0}".format(long_name)
+        parts.append(header)
+        parts.append(_paragraph(rng, rng.randint(1, 3), "              "))
+        parts.append("")
+    parts.extend([
+        "AUTHOR",
+        "       Written by {0}.".format(rng.choice(WORDS)),
+        "",
+        "SEE ALSO",
+        "       {0}(1)".format(rng.choice(WORDS)),
+        "",
+    ])
+    return '\n'.join(parts)
+
+
+def generate_corpus(pages, options, seed=0):
+    """
+    generate_corpus(pages, options, seed=0) -> {command: man page text}
+    """
+    return {
+        "synthetic{0}".format(number): generate_page("synthetic{0}".format(number), options, seed)
+        for number in range(pages)
+    }
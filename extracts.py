@@ -1,52 +1,918 @@
 #!/usr/bin/env python
+import codecs
+import gzip
+import hashlib
+import itertools
 import json
 import os
 import re
+import shlex
+import shutil
 import subprocess
 import time
 import urllib.request
+import uuid
 import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from xml.etree import ElementTree
+import paramiko
 from pexpect import pxssh
 import distro
 
-from celery import shared_task
+from billiard import Pool
+from billiard.exceptions import TimeoutError as WorkerTimeoutError
+from celery import chord, group, shared_task
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "CTAFramework.settings")
 from django import setup
+from django.apps import apps
 from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
 
-setup()
+# Scripts like the benchmarks configure django before importing the extracts
+if not apps.ready:
+    setup()
 
 ## Project import
-from apps.Products.models import Argument, Source, Command
+from apps.Products.managers import upsert
+from apps.Products.models import Argument, Source, Checkpoint, Command, Fingerprint, command_digest
+from apps.Products.man_reader import ArchiveReader, ManReader, render_source
 
 
-@shared_task()
-def run_extract(config):
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def run_extract(self, config):
     """
-    run_extract(config)
+    run_extract(self, config)
 
     Main function that gets configuration to run a given extract:
         2       -    M-extract
         3       -    P-Extract
-        3 or 4  -    R-Extract
+        4 or 5  -    R-Extract
+        6       -    Reparse the stored man pages of a source with M-Extract or P-Extract
+        7       -    Extract the man pages of a tar archive with M-Extract or P-Extract
+
+    OS and Product extracts with a list of "hosts" or "profiles" are run by HostsExtract.
+    The progress is published as the PROGRESS state of the task (check ExtractProgress).
+    The task is acknowledged when it finishes, a task redelivered after a lost worker keeps
+    its id and resumes from the checkpoint of the previous try
     """
+    progress = ExtractProgress(self)
+    config = dict(config)
+    # Internal flag, a client can not skip the check of its regular expression
+    config.pop('regex_checked', None)
+    if self.request.id:
+        config.setdefault('checkpoint', self.request.id)
     category = int(config.get('category'))
-    if category is 2:
+    check_config_regex(config)
+    if category in (2, 3) and not (config.get('hosts') or config.get('profiles')):
+        shards = plan_shards(config, regex_checked=True)
+        if shards:
+            signatures = [extract_shard.s(config, shard, regex_checked=True).set(task_id=str(uuid.uuid4()))
+                          for shard in shards]
+            # The shards publish the progress under their own ids, the Task record adds it up
+            progress.shards = {signature.id: len(shard) for (signature, shard) in zip(signatures, shards)}
+            progress.start('parse', sum(len(shard) for shard in shards))
+            # The chord callback inherits the id of this task, so the Task record follows it
+            return self.replace(chord(group(signatures), finish_extract.s(config, regex_checked=True)))
+    return json.dumps(execute_extract(config, progress=progress, regex_checked=True))
+
+
+def execute_extract(config, progress=None, regex_checked=False):
+    """
+    execute_extract(config, progress=None, regex_checked=False) -> summary dictionary
+
+    Run the extract of <config> in the current process, check run_extract for the
+    categories. It is used by run_extract and by the extract management command.
+    <regex_checked> is True when the caller already checked the regular expression of <config>
+    """
+    category = int(config.get('category'))
+    if not regex_checked:
+        check_config_regex(config)
+    if category in (2, 3) and (config.get('hosts') or config.get('profiles')):
+        # Several hosts in the same extract
+        h = HostsExtract(config, progress=progress)
+        h.run()
+        return h.summary()
+
+    if category == 2:
         # Extract Manpages
-        m = MExtract(api_config=config)
+        m = MExtract(api_config=config, progress=progress)
         m.run()
+        return m.summary()
 
-    elif category is 3:
+    elif category == 3:
         # Extract Product Commands
-        p = PExtract(config)
+        p = PExtract(config, progress=progress, regex_checked=True)
         p.run()
-        return json.dumps(p.results)
+        return p.summary()
 
     elif category in (4, 5):
         # Extract Robot
-        r = RExtract(config)
+        r = RExtract(config, progress=progress)
         r.run_r_extract()
+        return r.summary()
+
+    elif category == 6:
+        # Parse again the stored man pages of an OS or Product
+        source = Source.objects.get(id=config.get('source'))
+        if source.category == 3:
+            m = PExtract(config, progress=progress, regex_checked=True)
+        else:
+            m = MExtract(api_config=config, progress=progress)
+        m.reparse()
+        return m.summary()
+
+    elif category == 7:
+        # Man pages copied from a host without connection
+        if config.get('source') and Source.objects.get(id=config.get('source')).category == 3:
+            m = PExtract(config, progress=progress, regex_checked=True)
+        else:
+            m = MExtract(api_config=config, progress=progress)
+        m.run_archive()
+        return m.summary()
+    raise Exception("Unknown extract category {0}".format(category))
+
+
+def check_config_regex(config):
+    """
+    check_config_regex(config)
+
+    Check the user regular expression "regex" of <config> with check_regex, it is done once
+    per extract and the extracts of its shards or hosts get regex_checked=True to just compile
+    it. Raises an Exception when it is not valid or too slow
+    """
+    if not config.get('regex'):
+        return
+    try:
+        check_regex(config.get('regex'), pages=_regex_sample(config))
+    except re.error as error:
+        print("Invalid Regular Expression = {}".format(error))
+        raise Exception("Invalid Regular Expression = {}".format(error))
+
+
+def _new_extract(config, progress=None, regex_checked=False):
+    """
+    _new_extract(config, progress=None, regex_checked=False) -> MExtract | PExtract
+    """
+    if int(config.get('category')) == 3:
+        return PExtract(config, progress=progress, regex_checked=regex_checked)
+    return MExtract(api_config=config, progress=progress)
+
+
+def plan_shards(config, regex_checked=False):
+    """
+    plan_shards(config, regex_checked=False) -> list of lists of commands | None
+
+    Split the commands of a remote OS or Product extract in shards of "shard_size" commands
+    (settings.CTA_EXTRACT_SHARD_SIZE by default). Local extracts are not sharded, every
+    worker node has its own man pages. None when the extract is not worth sharding
+    """
+    size = int(config.get('shard_size') or settings.CTA_EXTRACT_SHARD_SIZE)
+    if size <= 0 or not config.get('host') or config.get('commands'):
+        return None
+    commands = _new_extract(config, regex_checked=regex_checked).list_remote_commands()
+    if len(commands) <= size:
+        return None
+    return [commands[position:position + size] for position in range(0, len(commands), size)]
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def extract_shard(self, config, commands, regex_checked=False):
+    """
+    extract_shard(self, config, commands, regex_checked=False) -> dictionary
+
+    Extract the <commands> of one shard of an OS or Product extract, the removed commands
+    and the corpus index are left to finish_extract. Errors are returned instead of raised,
+    so the chord always reaches its callback
+    """
+    shard_config = dict(config, commands=commands, checkpoint=self.request.id)
+    extract = None
+    try:
+        extract = _new_extract(shard_config, progress=ExtractProgress(self), regex_checked=regex_checked)
+        return extract.run_shard()
+    except Exception as error:
+        print(" error in shard: {}".format(error))
+        if extract is not None:
+            result = extract.summary()
+        else:
+            result = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'errors': []}
+        result['errors'].append("Shard of {0} commands failed: {1}".format(len(commands), error))
+        result.update({'failed': True, 'source': None, 'seen': [], 'digests': {}})
+        return result
+
+
+@shared_task(bind=True)
+def finish_extract(self, results, config, regex_checked=False):
+    """
+    finish_extract(self, results, config, regex_checked=False) -> json string
+
+    Chord callback of a sharded extract, merges the results of the shards, removes the
+    commands that are not in the source anymore and finalizes the Task record
+    """
+    # Imported here so the extracts do not need the Users app (e.g. benchmarks)
+    from apps.Users.models import Task
+
+    extract = _new_extract(config, regex_checked=regex_checked)
+    summary = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'errors': [], 'shards': len(results)}
+    failed = False
+    for result in results:
+        for key in ('added', 'changed', 'unchanged'):
+            summary[key] += result.get(key, 0)
+        summary['errors'].extend(result.get('errors', []))
+        failed = failed or result.get('failed', False)
+        extract.seen.update(result.get('seen', []))
+        if result.get('source') is not None:
+            extract.source = Source.objects.get(pk=result['source'])
+    if extract.source is None:
+        # No shard got to the source, every one of them failed
+        failed = True
+        summary['errors'].append("The source was not extracted, all the shards failed")
+    elif not failed:
+        extract.fingerprints = _load_fingerprints(extract.source)
+        extract.corpus = extract._get_corpus()
+        if extract.corpus is not None:
+            for result in results:
+                extract.corpus.index.update(result.get('digests', {}))
+        extract._finish()
+        summary['removed'] = extract.stats['removed']
+    else:
+        # The commands of the failed shards were not seen, but they can still exist
+        summary['errors'].append("Commands not removed, some shards failed")
+    result = json.dumps(summary)
+    Task.objects.filter(task_id=self.request.id).update(
+        state='FAILURE' if failed else 'SUCCESS',
+        task_info=result
+    )
+    return result
+
+
+class ExtractProgress:
+    """
+    ExtractProgress
+
+    Publish the progress of an extract as the PROGRESS state of its celery task, the meta
+    of the state is a dictionary with the keys:
+        phase            - "fetch", "parse" or "persist"
+        done             - commands or libraries processed
+        total            - commands or libraries to process, None while it is unknown
+        percent
+        pages_per_second - commands or libraries processed per second in the phase
+        elapsed          - seconds since the extract started
+        eta              - seconds left for the phase, None while it is unknown
+        shards           - {task id: commands} of the shards of a sharded extract, they
+                           publish their own progress
+
+    The state is published at most once every CTA_EXTRACT_PROGRESS_INTERVAL seconds and
+    it does nothing without a task, so extracts can run outside celery
+    """
+    def __init__(self, task=None, interval=None):
+        self.task = task
+        self.interval = settings.CTA_EXTRACT_PROGRESS_INTERVAL if interval is None else interval
+        self.started = time.time()
+        self.phase_started = self.started
+        self.phase = None
+        self.done = 0
+        self.total = None
+        self.last_publish = 0
+        self.shards = None
+
+    def start(self, phase, total=None):
+        """
+        start(self, phase, total=None)
+
+        Begin a new <phase> of the extract, <total> is the number of items it will process
+        """
+        self.phase = phase
+        self.done = 0
+        self.total = total
+        self.phase_started = time.time()
+        self.publish(force=True)
+
+    def advance(self, count=1):
+        """
+        advance(self, count=1)
+        """
+        self.done += count
+        self.publish()
+
+    def meta(self):
+        """
+        meta(self) -> dictionary of the progress
+        """
+        now = time.time()
+        elapsed = now - self.phase_started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        percent = None
+        if self.total:
+            percent = round(100.0 * self.done / self.total, 1)
+            if rate > 0:
+                eta = round(max(self.total - self.done, 0) / rate)
+        return {
+            'phase': self.phase,
+            'done': self.done,
+            'total': self.total,
+            'percent': percent,
+            'pages_per_second': round(rate, 2),
+            'elapsed': round(now - self.started),
+            'eta': eta,
+            'shards': self.shards,
+        }
+
+    def publish(self, force=False):
+        """
+        publish(self, force=False)
+
+        Update the state of the task, unless it was updated less than <interval> seconds ago
+        """
+        if self.task is None or not self.task.request.id:
+            return
+        now = time.time()
+        if not force and now - self.last_publish < self.interval:
+            return
+        self.last_publish = now
+        try:
+            self.task.update_state(state='PROGRESS', meta=self.meta())
+        except Exception as error:
+            print(" error publishing the progress: {}".format(error))
+
+
+# Section headers of a man page
+SECTIONS_RE = re.compile(r'(^[A-Z]+\s*[A-Z]*\s*[A-Z]*\n)', flags=re.M)
+# Arguments of generic linux distros
+ARGUMENTS_RE = re.compile(
+    r"( {2}-\w+, --\w+[ \n=]| {2}-\w+[ \n=]| {2}--\w+[ \n=]|"
+    r" {2}--\w+-\w+[ \n=]|"
+    r" {2}-\w+, --\w+-\w+[ \n=])(?=[ <]*)",
+    flags=re.M
+)
+# Arguments that need a value
+SP_ARGUMENTS_RE = re.compile(
+    r"( {2}-\w+, --\w+[ =]| {2}-\w+[ =]|"
+    r" {2}--\w+[ =]|"
+    r" {2}--\w+-\w+[ =]|"
+    r" {2}-\w+, --\w+-\w+[ =])(?=[<\w])",
+    flags=re.M
+)
+# Sections where the arguments are searched, in this order
+ARGUMENTS_SECTIONS = ('OPTIONS', 'DESCRIPTION')
+
+
+def tokenize_manpage(text, sections_list, arguments_re=ARGUMENTS_RE, sp_arguments_re=SP_ARGUMENTS_RE,
+                     sections_re=SECTIONS_RE):
+    """
+    tokenize_manpage(text, sections_list, arguments_re, sp_arguments_re, sections_re) -> generator
+
+    Single pass tokenizer of a man page, it yields:
+        ('section', name, body)                       - every section of <sections_list>, in order
+        ('option', name, needs_value, description)   - every argument of ARGUMENTS_SECTIONS
+
+    The section headers are found with one scan of <text> and the arguments with one scan of
+    the body of their sections. <arguments_re> must have exactly one group, the results are
+    the same than splitting the man page with MExtract._parse_sections and _parse_arguments
+    """
+    bodies = dict()
+    section_name = None
+    position = 0
+    for match in sections_re.finditer(text):
+        if section_name is not None:
+            bodies[section_name] = text[position:match.start()]
+            yield ('section', section_name, bodies[section_name])
+        name = match.group().strip()
+        section_name = name if name in sections_list else None
+        position = match.end()
+    if section_name is not None:
+        bodies[section_name] = text[position:]
+        yield ('section', section_name, bodies[section_name])
+
+    for section in ARGUMENTS_SECTIONS:
+        body = bodies.get(section)
+        if body is None:
+            continue
+        sp_arguments = None
+        argument_name = None
+        needs_value = False
+        for (line, match) in _split_arguments(body, arguments_re):
+            stripped_line = line.strip()
+            if not stripped_line:
+                continue
+            if stripped_line[0] == '-':
+                argument_name = stripped_line
+                needs_value = False
+                if line[-1] in ' =':
+                    # Most of the times the argument with value is found at the same position
+                    sp_match = None if match is None else sp_arguments_re.match(body, match.start())
+                    needs_value = sp_match is not None and sp_match.group(1) == line
+                    if not needs_value:
+                        if sp_arguments is None:
+                            sp_arguments = set(sp_arguments_re.findall(body))
+                        needs_value = line in sp_arguments
+                continue
+            if argument_name is not None:
+                yield ('option', argument_name, needs_value, stripped_line)
+                argument_name = None
+
+
+def _split_arguments(body, arguments_re):
+    """
+    _split_arguments(body, arguments_re) -> generator of (piece, match | None)
+
+    Same pieces than re.split(arguments_re, body) without building the list, the arguments
+    come with their match object
+    """
+    position = 0
+    for match in arguments_re.finditer(body):
+        yield (body[position:match.start()], None)
+        yield (match.group(1), match)
+        position = match.end()
+    yield (body[position:], None)
+
+
+# Line written before every man page on a harvest, followed by the command name
+HARVEST_DELIMITER = '@@BLUEXOLO-MANPAGE@@'
+HARVEST_DELIMITER_RE = re.compile('^{0} (.*)\n'.format(re.escape(HARVEST_DELIMITER)), flags=re.M)
+# Bytes of the gzipped harvest read at once
+HARVEST_CHUNK_SIZE = 64 * 1024
+
+
+def _config_flag(config, key, default=False):
+    """
+    _config_flag(config, key, default=False) -> True | False
+
+    Reads a boolean option of an extract config, values can come from json or from a form
+    """
+    value = config.get(key) if config else None
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'on', 'yes')
+    return bool(value)
+
+
+def _digest(text):
+    """
+    _digest(text) -> sha1 hexdigest
+
+    Fingerprint of the raw documentation of a command
+    """
+    return hashlib.sha1(text.encode('utf-8', errors='replace')).hexdigest()
+
+
+def _load_fingerprints(source):
+    """
+    _load_fingerprints(source) -> {name: digest}
+
+    Get the fingerprints of the commands already extracted for <source>
+    """
+    if getattr(source, 'pk', None) is None:
+        return dict()
+    return dict(Fingerprint.objects.filter(source=source).values_list('name', 'digest'))
+
+
+def _remove_fingerprints(source, names):
+    """
+    _remove_fingerprints(source, names)
+
+    The commands <names> are not in <source> anymore, remove their fingerprints and the
+    link between the command and the source
+    """
+    if not names or getattr(source, 'pk', None) is None:
+        return
+    fingerprints = Fingerprint.objects.filter(source=source, name__in=names)
+    command_ids = [pk for pk in fingerprints.values_list('command_id', flat=True) if pk]
+    with transaction.atomic():
+        Command.source.through.objects.filter(source=source, command_id__in=command_ids).delete()
+        fingerprints.delete()
+        _delete_orphan_commands(command_ids)
+
+
+def _delete_orphan_commands(command_ids):
+    """
+    _delete_orphan_commands(command_ids) -> number of commands deleted
+
+    Delete the commands of <command_ids> that are not linked to any source anymore, with
+    their arguments. A command changed in its last source is a new row and the previous
+    one is left without sources
+    """
+    orphans = Command.objects.filter(pk__in=list(command_ids), source=None)
+    deleted = orphans.count()
+    if deleted:
+        orphans.delete()
+    return deleted
+
+
+# Extract instance used by the pool workers, it is set once per worker by _init_extract_worker
+_worker_extract = None
+
+
+def _init_extract_worker(extract):
+    """
+    _init_extract_worker(extract)
+
+    Pool initializer, keeps the extract in the worker so every task just sends a command name
+    """
+    global _worker_extract
+    _worker_extract = extract
+
+
+def _fetch_and_parse_worker(command):
+    """
+    _fetch_and_parse_worker(command) -> (command, record | None)
+
+    Pool task, fetch and parse the man page of <command> inside a worker process
+    """
+    return command, _worker_extract._fetch_and_parse(command)
+
+
+def _archive_page_worker(command, source):
+    """
+    _archive_page_worker(command, source) -> (command, record | None)
+
+    Pool task, render, fingerprint and parse the source of a man page read from an archive
+    by the collector process
+    """
+    return command, _worker_extract._process_archive_page(source, command)
+
+
+def _parse_manpage_worker(manpage, command):
+    """
+    _parse_manpage_worker(manpage, command) -> record
+
+    Guard task, parse a man page with a user regular expression inside the guard process
+    """
+    return _worker_extract._parse_manpage(manpage, command)
+
+
+# Man page lines that make ambiguous regular expressions backtrack catastrophically
+REGEX_PROBES = [
+    ' ' * 64 + '-' * 64 + '!\n',
+    '  -' + 'a' * 64 + '!\n',
+    '  --' + 'a-' * 48 + '=!\n',
+    '  -a, --' + 'a' * 64 + ' ' * 64 + '!\n',
+    'OPTIONS\n' + ('       -a, --all=VALUE ' * 16) + '!\n',
+]
+
+
+def _regex_probe(pattern, flags, pages):
+    """
+    _regex_probe(pattern, flags, pages) -> number of pages
+
+    Probe task, run a regular expression over <pages> the same ways the parsers use it
+    """
+    compiled = re.compile(pattern, flags)
+    for page in pages:
+        compiled.split(page)
+        for match in compiled.finditer(page):
+            pass
+    return len(pages)
+
+
+def _regex_sample(config):
+    """
+    _regex_sample(config) -> list of man pages
+
+    Up to settings.CTA_REGEX_SAMPLE_PAGES man pages of the corpus of the source of <config>,
+    used to check a user regular expression with real pages
+    """
+    try:
+        corpus = ManCorpus(Source.objects.get(id=config.get('source')))
+    except Exception:
+        return []
+    pages = []
+    for command in sorted(corpus.index)[:settings.CTA_REGEX_SAMPLE_PAGES]:
+        page = corpus.get(command)
+        if page is not None:
+            pages.append(page)
+    return pages
+
+
+def check_regex(pattern, flags=re.M, pages=None, budget=None):
+    """
+    check_regex(pattern, flags=re.M, pages=None, budget=None) -> compiled regular expression
+
+    Compile a user regular expression and run it over the sample man pages <pages> and
+    REGEX_PROBES in a separate process, that is killed when it takes more than <budget>
+    seconds (settings.CTA_REGEX_CHECK_BUDGET by default). Raises re.error when the regular
+    expression is not valid or too slow
+    """
+    compiled = re.compile(pattern, flags)
+    budget = float(budget or settings.CTA_REGEX_CHECK_BUDGET)
+    sample = list(pages or []) + REGEX_PROBES
+    pool = Pool(1)
+    try:
+        pool.apply_async(_regex_probe, (pattern, flags, sample)).get(timeout=budget)
+    except WorkerTimeoutError:
+        raise re.error("it takes more than {0} seconds with the sample man pages".format(budget))
+    finally:
+        pool.terminate()
+        pool.join()
+    return compiled
+
+
+class BulkWriter:
+    """
+    BulkWriter
+
+    Class created to save the commands and arguments of an extract in batches, instead of a
+    get_or_create per row every <batch_size> commands are written with bulk inserts in a
+    single transaction.
+
+    Commands are content addressed, a command is identified by the command_digest of its name,
+    description and arguments. The same command extracted from several sources (e.g. every
+    version of an OS) is one row with its arguments and the new sources just add links. The
+    rows are upserted on their unique indexes, so concurrent extracts (e.g. the shards of an
+    extract) do not write duplicates.
+
+    It keeps an in-memory index of the known command digests and Command.source links, so
+    known rows are never queried again.
+    """
+    def __init__(self, batch_size=None, results=None):
+        """
+        __init__(self, batch_size=None, results=None)
+
+        Initialization of BulkWriter:
+            batch_size - number of commands written per transaction
+                         (settings.CTA_EXTRACT_BATCH_SIZE by default)
+            results    - list where the commands that could not be saved are reported
+        """
+        self.batch_size = int(batch_size or settings.CTA_EXTRACT_BATCH_SIZE)
+        self.results = results if results is not None else []
+        self.pending = []
+        self.created = {'commands': 0, 'arguments': 0, 'links': 0}
+        # Batches that could not be written
+        self.failures = 0
+        self._reset_index()
+
+    def _reset_index(self):
+        """
+        _reset_index(self)
+
+        Forget the indexed rows, they are loaded again from the database when needed
+        """
+        self.loaded_sources = set()
+        self.commands_index = dict()
+        self.links_index = set()
+
+    def add(self, source, name, description, arguments, label=None, fingerprint=None):
+        """
+        add(self, source, name, description, arguments, label=None, fingerprint=None)
+
+        Queue a command of <source>, <arguments> is a list of dictionaries with the Argument
+        fields (name, description, requirement, needs_value). <label> is the name reported
+        in results if the command can not be saved and <fingerprint> a (name, digest, is_new)
+        tuple saved in the same transaction than the command
+        """
+        digest = command_digest(name, description, arguments)
+        self.pending.append((source, name, description, arguments, label or name, fingerprint, digest))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        flush(self)
+
+        Write the queued commands, their arguments and source links in one transaction
+        """
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        try:
+            with transaction.atomic():
+                for source in {row[0] for row in pending}:
+                    self._load_source(source)
+                self._write_commands(pending)
+                self._write_links(pending)
+                self._write_fingerprints(pending)
+        except Exception as error:
+            print(" error in Bulk DB: {}".format(error))
+            self.failures += 1
+            # The index can have rows of the rolled back transaction
+            self._reset_index()
+            for row in pending:
+                self.results.append("{0} not saved".format(row[4]))
+
+    def _load_source(self, source):
+        """
+        _load_source(self, source)
+
+        Index the commands and links that already exist for <source>
+        """
+        source_id = getattr(source, 'pk', None)
+        if source_id is None or source_id in self.loaded_sources:
+            return
+        for (command_id, digest) in Command.objects.filter(source=source_id).values_list('id', 'digest'):
+            if digest:
+                self.commands_index.setdefault(digest, command_id)
+            self.links_index.add((command_id, source_id))
+        self.loaded_sources.add(source_id)
+
+    def _write_commands(self, pending):
+        """
+        _write_commands(self, pending)
+
+        Make sure every command of <pending> has a Command row in the index, the commands
+        that are not in any source yet are upserted with their arguments, so concurrent
+        extracts of the same commands do not create duplicates
+        """
+        missing = dict()
+        for row in pending:
+            if row[6] not in self.commands_index:
+                missing.setdefault(row[6], row)
+        if not missing:
+            return
+        for (digest, command_id) in Command.objects.filter(digest__in=list(missing)).values_list('digest', 'id'):
+            self.commands_index.setdefault(digest, command_id)
+        new_rows = [row for (digest, row) in missing.items() if digest not in self.commands_index]
+        if not new_rows:
+            return
+        self.created['commands'] += Command.objects.upsert(
+            [{'name': row[1], 'description': row[2], 'digest': row[6]} for row in new_rows],
+            ('digest',)
+        )
+        created = Command.objects.filter(digest__in=[row[6] for row in new_rows]).values_list('digest', 'id')
+        for (digest, command_id) in created:
+            self.commands_index.setdefault(digest, command_id)
+        new_arguments = []
+        for row in new_rows:
+            command_id = self.commands_index[row[6]]
+            for argument in row[3]:
+                new_arguments.append(dict({'requirement': False, 'needs_value': False, 'description': ''},
+                                          command_id=command_id, **argument))
+        if new_arguments:
+            self.created['arguments'] += Argument.objects.upsert(new_arguments, ('command', 'name'))
+
+    def _write_links(self, pending):
+        """
+        _write_links(self, pending)
+
+        Upsert the Command.source links that are not indexed yet
+        """
+        links = []
+        for row in pending:
+            source_id = getattr(row[0], 'pk', None)
+            if source_id is None:
+                continue
+            key = (self.commands_index[row[6]], source_id)
+            if key not in self.links_index:
+                self.links_index.add(key)
+                links.append({'command_id': key[0], 'source_id': key[1]})
+        self.created['links'] += upsert(Command.source.through, links, ('command', 'source'))
+
+    def _write_fingerprints(self, pending):
+        """
+        _write_fingerprints(self, pending)
+
+        Upsert the fingerprints of the new and the changed commands. A changed command is a
+        new row, the source is unlinked from the previous one
+        """
+        fingerprints = dict()
+        changed = dict()
+        for (source, name, description, arguments, label, fingerprint, digest) in pending:
+            source_id = getattr(source, 'pk', None)
+            if fingerprint is None or source_id is None:
+                continue
+            (fingerprint_name, fingerprint_digest, is_new) = fingerprint
+            command_id = self.commands_index[digest]
+            fingerprints[(source_id, fingerprint_name)] = {
+                'source_id': source_id,
+                'name': fingerprint_name,
+                'digest': fingerprint_digest,
+                'command_id': command_id
+            }
+            if not is_new:
+                changed.setdefault(source_id, dict())[fingerprint_name] = command_id
+        previous = dict()
+        for (source_id, names) in changed.items():
+            rows = Fingerprint.objects.filter(source_id=source_id, name__in=list(names)).values_list('name', 'command_id')
+            previous[source_id] = dict(rows)
+        Fingerprint.objects.upsert(list(fingerprints.values()), ('source', 'name'), ('digest', 'command'))
+        for (source_id, names) in changed.items():
+            stale = {pk for (name, pk) in previous[source_id].items() if pk and pk != names[name]}
+            if not stale:
+                continue
+            # Other commands of the source can still use the previous row
+            stale.difference_update(
+                Fingerprint.objects.filter(source_id=source_id, command_id__in=stale).values_list('command_id', flat=True)
+            )
+            Command.source.through.objects.filter(source_id=source_id, command_id__in=stale).delete()
+            self.links_index.difference_update((pk, source_id) for pk in stale)
+            _delete_orphan_commands(stale)
+            for (key, command_id) in list(self.commands_index.items()):
+                if command_id in stale:
+                    del self.commands_index[key]
+
+
+class ManCorpus:
+    """
+    ManCorpus
+
+    Class created to keep the raw man pages of a Source on disk, so they can be parsed again
+    without connecting to the host. Man pages are gzipped and stored by their digest:
+
+        <CTA_CORPUS_ROOT>/<source id>/objects/<digest[:2]>/<digest>.gz
+        <CTA_CORPUS_ROOT>/<source id>/index.json - {command: digest}
+    """
+    def __init__(self, source):
+        """
+        __init__(self, source)
+
+        Initialization of ManCorpus, loads the index of <source> if it exists
+        """
+        self.path = os.path.join(settings.CTA_CORPUS_ROOT, str(source.pk))
+        self.index_path = os.path.join(self.path, 'index.json')
+        self.index = dict()
+        try:
+            with open(self.index_path) as index_file:
+                self.index = json.load(index_file)
+        except (IOError, ValueError):
+            pass
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], '{0}.gz'.format(digest))
+
+    def put(self, text, digest):
+        """
+        put(self, text, digest)
+
+        Store the raw man page <text>, it is safe to call it from pool workers because the
+        index is not touched
+        """
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', errors='replace') as object_file:
+            object_file.write(text)
+        os.replace(tmp_path, path)
+
+    def get(self, command):
+        """
+        get(self, command) -> raw man page | None
+        """
+        digest = self.index.get(command)
+        if digest is None:
+            return None
+        try:
+            with gzip.open(self._object_path(digest), 'rt', encoding='utf-8') as object_file:
+                return object_file.read()
+        except IOError:
+            return None
+
+    def save(self, commands):
+        """
+        save(self, commands)
+
+        Write the index with just the <commands> of the last extract and delete the man pages
+        that are not referenced anymore
+        """
+        self.index = {command: self.index[command] for command in commands if command in self.index}
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = '{0}.tmp'.format(self.index_path)
+        with open(tmp_path, 'w') as index_file:
+            json.dump(self.index, index_file)
+        os.replace(tmp_path, self.index_path)
+        digests = set(self.index.values())
+        for (dirpath, dirnames, filenames) in os.walk(os.path.join(self.path, 'objects')):
+            for filename in filenames:
+                if filename.split('.')[0] not in digests:
+                    os.remove(os.path.join(dirpath, filename))
+
+    @staticmethod
+    def evict(keep=None):
+        """
+        evict(keep=None)
+
+        Delete the corpora not updated in settings.CTA_CORPUS_MAX_AGE days and then the oldest
+        ones until all of them fit in settings.CTA_CORPUS_MAX_SIZE bytes, <keep> is never deleted
+        """
+        root = settings.CTA_CORPUS_ROOT
+        if not os.path.isdir(root):
+            return
+        corpora = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if not os.path.isdir(path) or (keep is not None and path == keep.path):
+                continue
+            size = 0
+            for (dirpath, dirnames, filenames) in os.walk(path):
+                size += sum(os.path.getsize(os.path.join(dirpath, filename)) for filename in filenames)
+            corpora.append((os.path.getmtime(path), size, path))
+        corpora.sort()
+        total = sum(corpus[1] for corpus in corpora)
+        if keep is not None and os.path.isdir(keep.path):
+            for (dirpath, dirnames, filenames) in os.walk(keep.path):
+                total += sum(os.path.getsize(os.path.join(dirpath, filename)) for filename in filenames)
+        oldest = time.time() - settings.CTA_CORPUS_MAX_AGE * 24 * 60 * 60
+        for (modified, size, path) in corpora:
+            if modified < oldest or total > settings.CTA_CORPUS_MAX_SIZE:
+                print("Removing corpus {}".format(path))
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
 
 
 class MExtract:
@@ -60,9 +926,9 @@ class MExtract:
     # it is a command that would be sent into a server to get the list of commands in the
     # multiline string format, so the TODO is verify if this information is correct or if there
     # is an error in the script.
-    def __init__(self, sections_list=None, p_config=None, api_config=None):
+    def __init__(self, sections_list=None, p_config=None, api_config=None, progress=None):
         """
-        __init__(self, sections_list=None, p_config=None, api_config=None)
+        __init__(self, sections_list=None, p_config=None, api_config=None, progress=None)
 
         Initialization of MExtract:
             sections_list - list of sections of man pages information
@@ -82,6 +948,17 @@ class MExtract:
                                 "username"
                                 "password"
                                 "port"
+                            and optionally "workers", the number of processes used to fetch and
+                            parse the man pages (settings.CTA_EXTRACT_WORKERS by default) and
+                            "harvest", to get all the remote man pages with a single pipeline
+                            (settings.CTA_SSH_HARVEST by default), "batch_size", the
+                            number of commands saved per transaction, "force", to parse
+                            again the commands whose man page did not change, "commands", the
+                            list of commands of a shard, "shard_size", the commands per
+                            shard (settings.CTA_EXTRACT_SHARD_SIZE by default) and
+                            "checkpoint", the key of the checkpoint a retried extract resumes
+                            from (the id of the task by default)
+            progress      - ExtractProgress object to publish the progress of the extract
         """
         self.default_sections_list = [
             'NAME',
@@ -95,6 +972,46 @@ class MExtract:
         self.api_config = api_config
         self.initial_time = time.time()
         self.results = []
+        workers = None
+        batch_size = None
+        if self.api_config:
+            workers = self.api_config.get('workers')
+            batch_size = self.api_config.get('batch_size')
+        self.workers = int(workers or settings.CTA_EXTRACT_WORKERS)
+        self.writer = BulkWriter(batch_size=batch_size, results=self.results)
+        self.force = _config_flag(self.api_config, 'force')
+        self.corpus = None
+        self.read_from_corpus = False
+        self.fingerprints = dict()
+        self.seen = set()
+        self.stats = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+        self.man_reader = None
+        self.progress = progress if progress is not None else ExtractProgress()
+        # Seconds to parse a man page with a user regular expression (check PExtract)
+        self.page_timeout = None
+        self.guard_pool = None
+        self.checkpoint = None
+        self.checkpoint_done = dict()
+        # Commands processed since the checkpoint was saved, they are done once they are written
+        self.checkpoint_queue = dict()
+        self.checkpoint_failures = 0
+        self.source = None
+        # Parser options that are part of the fingerprints, check _fingerprint
+        self.parser_key = None
+
+    def _setup_regex(self):
+        """
+        _setup_regex(self)
+
+        Set the regular expressions used to split the sections and the arguments of man pages,
+        <p_config> can have an specific regular expression for arguments
+        """
+        self.sections_re = SECTIONS_RE
+        self.sp_arguments_re = SP_ARGUMENTS_RE
+        if self.p_config is not None and self.p_config[1]:
+            self.arguments_re = self.p_config[1]
+        else:
+            self.arguments_re = ARGUMENTS_RE
 
     def _split_list_of_commands(self):
         """
@@ -102,40 +1019,20 @@ class MExtract:
 
         Section that use regular expression to split the list of commands
         """
-        self.sections_re = re.compile('(^[A-Z]+\s*[A-Z]*\s*[A-Z]*\n)', flags=re.M)
-        self.sp_arguments_re = re.compile(
-            "( {2}-\w+, --\w+[ =]| {2}-\w+[ =]|"
-            " {2}--\w+[ =]|"
-            " {2}--\w+-\w+[ =]|"
-            " {2}-\w+, --\w+-\w+[ =])(?=[<\w])",
-            flags=re.M
-        )
+        self._setup_regex()
         if self.p_config is None:
             # Run this in case not a regular expression provided, get commands using compgen
             compgen = '/bin/bash -c "compgen -c"'
             commands = subprocess.getoutput(compgen)
             self.list_of_commands = commands.splitlines()
-            # Generating reular expression for generic linux distros
-            self.arguments_re = re.compile("( {2}-\w+, --\w+[ \n=]| {2}-\w+[ \n=]| {2}--\w+[ \n=]|"
-                                           " {2}--\w+-\w+[ \n=]|"
-                                           " {2}-\w+, --\w+-\w+[ \n=])(?=[ <]*)",
-                                           flags=re.M
-                                           )
             self.source = self._getSource(category=2)
         else:
             # Run this in case a non common commands wants to be extracted
             commands = self.p_config[0]
             self.list_of_commands = commands.splitlines()
-            if self.p_config[1]:
-                self.arguments_re = self.p_config[1]
-            else:
-                self.arguments_re = re.compile(
-                    "( {2}-\w+, --\w+[ \n=]| {2}-\w+[ \n=]|"
-                    " {2}--\w+[ \n=]| {2}--\w+-\w+[ \n=]|"
-                    " {2}-\w+, --\w+-\w+[ \n=])(?=[ <]*)",
-                    flags=re.M
-                )
             self.source = self._getSource(category=3)
+        self.fingerprints = _load_fingerprints(self.source)
+        self.corpus = self._get_corpus()
 
     def _ssh_regex(self):
         """
@@ -145,39 +1042,37 @@ class MExtract:
 
         returns a string for get commands
         """
-        self.sections_re = re.compile('(^[A-Z]+\s*[A-Z]*\s*[A-Z]*\n)', flags=re.M)
-        self.sp_arguments_re = re.compile(
-            "( {2}-\w+, --\w+[ =]| {2}-\w+[ =]|"
-            " {2}--\w+[ =]|"
-            " {2}--\w+-\w+[ =]|"
-            " {2}-\w+, --\w+-\w+[ =])(?=[<\w])",
-            flags=re.M
-        )
+        self._setup_regex()
         if self.p_config is None:
             # If not config, we suppose to get commands using standard linux way
             commands = '/bin/bash -c "compgen -c"'
-            self.arguments_re = re.compile("( {2}-\w+, --\w+[ \n=]| {2}-\w+[ \n=]| {2}--\w+[ \n=]|"
-                                           " {2}--\w+-\w+[ \n=]|"
-                                           " {2}-\w+, --\w+-\w+[ \n=])(?=[ <]*)",
-                                           flags=re.M
-                                           )
             self.source = self._getSource(category=2)
         else:
             # If config, we need to setup a command that returns the list of commands in a multiline string
             commands = self.p_config[0]
-            if self.p_config[1]:
-                self.arguments_re = self.p_config[1]
-            else:
-                self.arguments_re = re.compile(
-                    "( {2}-\w+, --\w+[ \n=]| {2}-\w+[ \n=]|"
-                    " {2}--\w+[ \n=]| {2}--\w+-\w+[ \n=]|"
-                    " {2}-\w+, --\w+-\w+[ \n=])(?=[ <]*)",
-                    flags=re.M
-                )
             self.source = self._getSource(category=3)
+        self.fingerprints = _load_fingerprints(self.source)
+        self.corpus = self._get_corpus()
+        if self.api_config.get('commands'):
+            # Shard of an extract, the commands were listed before
+            commands = "printf '%s\\n' {0}".format(' '.join(shlex.quote(command)
+                                                             for command in self.api_config['commands']))
 
         return commands
 
+    def _get_corpus(self):
+        """
+        _get_corpus(self) -> ManCorpus | None
+
+        The corpus where the raw man pages of the source are stored, it is disabled with the
+        "corpus" config key (settings.CTA_CORPUS by default)
+        """
+        if getattr(self.source, 'pk', None) is None:
+            return None
+        if not _config_flag(self.api_config, 'corpus', settings.CTA_CORPUS):
+            return None
+        return ManCorpus(self.source)
+
     def run(self):
         """
         run(self)
@@ -188,6 +1083,255 @@ class MExtract:
             self._run_with_ssh()
         else:
             self._run_with_default()
+        self._finish()
+
+    def reparse(self):
+        """
+        reparse(self)
+
+        Parse again the man pages stored in the corpus of the source (api_config "source"),
+        it does not connect to the host, so it is used when the regular expressions change
+        """
+        self._setup_regex()
+        self.source = Source.objects.get(id=self.api_config.get('source'))
+        self.corpus = ManCorpus(self.source)
+        if not self.corpus.index:
+            raise Exception("There is no corpus stored for {0}".format(self.source))
+        # The man pages did not change, but the way to parse them did
+        self.force = True
+        self.fingerprints = _load_fingerprints(self.source)
+        self.read_from_corpus = True
+        commands = self._start_checkpoint(lambda: sorted(self.corpus.index))
+        if self.workers > 1:
+            records = self._parallel_fetch_and_parse(commands)
+        else:
+            records = ((command, self._fetch_and_parse(command)) for command in commands)
+        self._save_records(records)
+        self._finish()
+
+    def run_archive(self):
+        """
+        run_archive(self)
+
+        Extract the man pages of a tar archive of the man directory of a host that can not be
+        reached (api_config "archive"), it is read as a stream without unpacking it and the
+        pages are parsed while it is read
+        """
+        self._setup_regex()
+        self.source = self._get_archive_source()
+        self.fingerprints = _load_fingerprints(self.source)
+        self.corpus = self._get_corpus()
+        commands = self._archive_commands()
+        self.progress.start('parse', len(commands) if commands is not None else None)
+        sources = ArchiveReader(self.api_config.get('archive'), commands=commands).sources_of_pages()
+        if self.workers > 1:
+            records = self._parallel_archive_pages(sources)
+        else:
+            records = ((command, self._process_archive_page(source, command)) for (command, source) in sources)
+        self._save_records(records)
+        if not self.seen:
+            raise Exception("There where no man pages in the archive")
+        self._finish()
+
+    def _get_archive_source(self):
+        """
+        _get_archive_source(self) -> Source object
+
+        The source of api_config "source", or the OS of the "name" and "version" keys
+        """
+        if self.api_config.get('source'):
+            return Source.objects.get(id=self.api_config.get('source'))
+        if not self.api_config.get('name'):
+            raise Exception("The source or the name of the OS of the archive is needed")
+        source, created = Source.objects.get_or_create(
+            name=self.api_config.get('name'),
+            version=self.api_config.get('version') or '',
+            category=2
+        )
+        return source
+
+    def _archive_commands(self):
+        """
+        _archive_commands(self) -> list of commands | None
+
+        Commands of the host of an archive: api_config "commands" or "compgen", a file with
+        the output of "compgen -c" in the host. None when they are not known, all the pages of
+        commands of the archive are extracted in that case
+        """
+        if self.api_config.get('commands'):
+            return sorted(set(self.api_config['commands']))
+        if not self.api_config.get('compgen'):
+            return None
+        with open(self.api_config['compgen'], encoding='utf-8', errors='replace') as compgen:
+            return sorted(set(line.strip() for line in compgen if line.strip()))
+
+    def _process_archive_page(self, source, command):
+        """
+        _process_archive_page(self, source, command) -> record | None
+
+        Render the <source> of a man page of an archive and process it
+        """
+        manpage = render_source(source) if source is not None else None
+        return self._process_manpage(manpage, command)
+
+    def _parallel_archive_pages(self, sources):
+        """
+        _parallel_archive_pages(self, sources) -> generator of (command, record)
+
+        Fan out the render, fingerprint and parse of the (command, source) pairs of <sources>
+        into a pool of <self.workers> processes. Sources are sent as they are read, with at
+        most a few of them waiting per worker, and records are yielded in the same order
+        """
+        # Forked workers must not share the parent database connection
+        connections.close_all()
+        pool = Pool(self.workers, initializer=_init_extract_worker, initargs=(self,))
+        pending = deque()
+        try:
+            for (command, source) in sources:
+                pending.append(pool.apply_async(_archive_page_worker, (command, source)))
+                if len(pending) >= self.workers * 4:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def run_shard(self):
+        """
+        run_shard(self) -> dictionary
+
+        Fetch, parse and save the commands of <api_config> "commands", one shard of an extract.
+        The removed commands and the corpus index are left to finish_extract, the only one
+        that sees the commands of all the shards
+
+        Returns the summary with the keys "source", "seen" and "digests" of the corpus index
+        """
+        self._run_with_ssh()
+        self._close_guard()
+        self.progress.start('persist')
+        self.writer.flush()
+        self._clear_checkpoint()
+        result = self.summary()
+        result['source'] = self.source.pk
+        result['seen'] = sorted(self.seen)
+        result['digests'] = dict()
+        if self.corpus is not None:
+            result['digests'] = {command: self.corpus.index[command] for command in self.seen}
+        return result
+
+    def _finish(self):
+        """
+        _finish(self)
+
+        Write the pending commands, remove the commands that are not in the source anymore
+        and keep the corpus index
+        """
+        self._close_guard()
+        self.progress.start('persist')
+        self.writer.flush()
+        removed = set(self.fingerprints).difference(self.seen)
+        _remove_fingerprints(self.source, removed)
+        self.stats['removed'] = len(removed)
+        if self.corpus is not None:
+            self.corpus.save(self.seen)
+            ManCorpus.evict(keep=self.corpus)
+        self._clear_checkpoint()
+
+    def _start_checkpoint(self, list_commands):
+        """
+        _start_checkpoint(self, list_commands) -> list of commands to extract | None
+
+        Load the checkpoint of <api_config> "checkpoint" (the id of the task by default). The
+        commands are listed with <list_commands> the first time and kept in the checkpoint,
+        a retried task skips the ones persisted by the previous try.
+
+        Returns None when the extract has no checkpoint and the commands were not listed
+        """
+        key = self.api_config.get('checkpoint') if self.api_config else None
+        if not key or getattr(self.source, 'pk', None) is None:
+            commands = list_commands()
+            if commands is not None:
+                self.progress.start('parse', len(commands))
+            return commands
+        checkpoint, created = Checkpoint.objects.get_or_create(key=key, defaults={'source': self.source})
+        if created or not checkpoint.commands:
+            commands = list(list_commands() or [])
+            done = dict()
+            checkpoint.commands = json.dumps(commands)
+            checkpoint.done = json.dumps(done)
+            checkpoint.save()
+        else:
+            commands = json.loads(checkpoint.commands)
+            done = json.loads(checkpoint.done or '{}')
+            print("Resuming the extract, {0} of {1} commands done".format(len(done), len(commands)))
+        self.checkpoint = checkpoint
+        self.checkpoint_done = done
+        for (command, digest) in done.items():
+            # Commands with a man page, persisted by the previous try
+            if digest:
+                self.seen.add(command)
+                if self.corpus is not None:
+                    self.corpus.index[command] = digest
+        self.progress.start('parse', len(commands))
+        self.progress.advance(len(done))
+        return [command for command in commands if command not in done]
+
+    def _save_records(self, records):
+        """
+        _save_records(self, records)
+
+        Save the (command, record) pairs of <records> as they arrive, the checkpoint is
+        updated every batch of commands
+        """
+        for (command, record) in records:
+            self.progress.advance()
+            if record is not None:
+                self._save_record(record)
+            if self.checkpoint is not None:
+                self.checkpoint_queue[command] = record['digest'] if record is not None else ''
+                if len(self.checkpoint_queue) >= self.writer.batch_size:
+                    self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        """
+        _save_checkpoint(self)
+
+        Write the queued commands and then the checkpoint, so the checkpoint never has
+        commands that are not in the database. When a batch of the writer failed since the
+        last checkpoint the commands are not marked as done, a retried task extracts them again
+        """
+        self.writer.flush()
+        if self.writer.failures == self.checkpoint_failures:
+            self.checkpoint_done.update(self.checkpoint_queue)
+        self.checkpoint_failures = self.writer.failures
+        self.checkpoint_queue = dict()
+        self.checkpoint.done = json.dumps(self.checkpoint_done)
+        self.checkpoint.save(update_fields=['done', 'updated'])
+
+    def _clear_checkpoint(self):
+        """
+        _clear_checkpoint(self)
+
+        Delete the checkpoint of a finished extract and the ones of extracts that were never
+        finished (settings.CTA_CHECKPOINT_MAX_AGE days)
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.delete()
+            self.checkpoint = None
+        limit = timezone.now() - timedelta(days=settings.CTA_CHECKPOINT_MAX_AGE)
+        Checkpoint.objects.filter(updated__lt=limit).delete()
+
+    def summary(self):
+        """
+        summary(self) -> dictionary
+
+        Returns the counts of added, changed, unchanged and removed commands and the errors
+        """
+        result = dict(self.stats)
+        result['errors'] = self.results
+        return result
 
     # TODO: remove duplicity of _run_with_default and _run_with_ssh codes
     def _run_with_default(self):
@@ -196,46 +1340,226 @@ class MExtract:
 
         Get commands and arguments for local configuration
         """
+        self.progress.start('fetch')
         self._split_list_of_commands()
 
         if not self.list_of_commands:
             raise Exception("There where no commands for extraction")
 
-        for command in self.list_of_commands:
+        # Every command is fetched and parsed in the same step
+        commands = self._start_checkpoint(lambda: self.list_of_commands)
+        if self.workers > 1:
+            records = self._parallel_fetch_and_parse(commands)
+        else:
+            records = ((command, self._fetch_and_parse(command)) for command in commands)
+        # The DB writes are done just here, by the collector process
+        self._save_records(records)
+
+    def _parallel_fetch_and_parse(self, commands):
+        """
+        _parallel_fetch_and_parse(self, commands) -> generator of (command, record)
+
+        Fan out the fetch and parse of <commands> into a pool of <self.workers> processes,
+        records are yielded in the order they are finished
+        """
+        if not commands:
+            return
+        # Forked workers must not share the parent database connection
+        connections.close_all()
+        chunksize = max(1, min(32, len(commands) // (self.workers * 8)))
+        pool = Pool(self.workers, initializer=_init_extract_worker, initargs=(self,))
+        try:
+            for result in pool.imap_unordered(_fetch_and_parse_worker, commands, chunksize):
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _fetch_and_parse(self, command):
+        """
+        _fetch_and_parse(self, command) -> record | None
+
+        Get the man page of <command> and parse it, it does not touch the database so it can
+        run inside a pool worker
+        """
+        if self.read_from_corpus:
+            manpage = self.corpus.get(command)
+        else:
             manpage = self._get_manpage(command)
-            if manpage is None:
-                continue
-            self._parse_sections(manpage, command)
-            for section in ('OPTIONS', 'DESCRIPTION'):
-                self._parse_arguments(section, command)  # TODO. Needs to change for modularity
-            self._save_into_db(command)
+        return self._process_manpage(manpage, command)
+
+    def _process_manpage(self, manpage, command, parsed=None):
+        """
+        _process_manpage(self, manpage, command, parsed=None) -> record | None
+
+        Fingerprint the text of a <manpage> and parse it only if it changed since the last
+        extract, unchanged man pages return a record with the key "unchanged".
+        <parsed> is a dictionary of records by (command, fingerprint) shared between extracts, so
+        the same man page is parsed just once
+        """
+        if manpage is None:
+            return None
+        digest = _digest(manpage)
+        fingerprint = self._fingerprint(digest)
+        if self.corpus is not None and not self.read_from_corpus:
+            self.corpus.put(manpage, digest)
+        if not self.force and self.fingerprints.get(command) == fingerprint:
+            return {'command': command, 'digest': digest, 'fingerprint': fingerprint, 'unchanged': True}
+        if parsed is not None and (command, fingerprint) in parsed:
+            return parsed[(command, fingerprint)]
+        if self.page_timeout:
+            record = self._guarded_parse(manpage, command)
+            if record is None:
+                return {'command': command, 'digest': digest, 'fingerprint': fingerprint,
+                        'error': "{0} skipped, it takes more than {1} seconds to parse it with the "
+                                 "regular expression".format(command, self.page_timeout)}
+        else:
+            record = self._parse_manpage(manpage, command)
+        record['digest'] = digest
+        record['fingerprint'] = fingerprint
+        if parsed is not None:
+            parsed[(command, fingerprint)] = record
+        return record
+
+    def _fingerprint(self, digest):
+        """
+        _fingerprint(self, digest) -> sha1 hexdigest
+
+        Fingerprint of a man page with the <digest> of its text. It is the digest itself with
+        the default parser and it covers the <parser_key> too with a user regular expression,
+        so a page is only skipped when it would be parsed the same way
+        """
+        if self.parser_key is None:
+            return digest
+        return _digest('{0}\n{1}'.format(digest, self.parser_key))
+
+    def _guarded_parse(self, manpage, command):
+        """
+        _guarded_parse(self, manpage, command) -> record | None
+
+        Parse a man page in the guard process, that is killed when it takes more than
+        <page_timeout> seconds, so a pathological user regular expression can not hang the
+        worker. Returns None in that case
+        """
+        if self.guard_pool is None:
+            self.guard_pool = Pool(1, initializer=_init_extract_worker, initargs=(self,))
+        job = self.guard_pool.apply_async(_parse_manpage_worker, (manpage, command))
+        try:
+            return job.get(timeout=self.page_timeout)
+        except WorkerTimeoutError:
+            print(" timeout parsing {0}".format(command))
+            self._close_guard()
+            return None
+
+    def _close_guard(self):
+        """
+        _close_guard(self)
+
+        Kill the guard process, if any
+        """
+        if self.guard_pool is not None:
+            self.guard_pool.terminate()
+            self.guard_pool.join()
+            self.guard_pool = None
+
+    def _parse_manpage(self, manpage, command):
+        """
+        _parse_manpage(self, manpage, command) -> record
+
+        Parse sections and arguments of the text of a <manpage>, using tokenize_manpage when
+        the arguments regular expression has exactly one group, otherwise splitting it with
+        _parse_sections and _parse_arguments
+
+        Returns a plain dictionary with the keys "command", "sections" and "arguments"
+        """
+        if self.arguments_re.groups != 1:
+            self._parse_sections(re.split(self.sections_re, manpage), command)
+            for section in ARGUMENTS_SECTIONS:
+                self._parse_arguments(section, command)
+        else:
+            print("Working in {0} {1:.5}".format(command, time.time() - self.initial_time))
+            self.sections_dict = dict()
+            self.arguments_dict = dict()
+            name_description = " "
+            tokens = tokenize_manpage(manpage, self.sections_list, self.arguments_re, self.sp_arguments_re,
+                                      self.sections_re)
+            for token in tokens:
+                if token[0] == 'option':
+                    self.arguments_dict[token[1]] = [token[2], token[3]]
+                elif token[1] == 'NAME':  ## TODO Needs to change for modularity
+                    self.sections_dict['NAME'] = command
+                    name_description = re.split(" [-—] ", token[2].strip())
+                elif token[1] == 'SYNOPSIS':  ## TODO Needs to change for modularity
+                    # The synopsis keeps the short description of the NAME section
+                    try:
+                        self.sections_dict['SYNOPSIS'] = name_description[1]
+                    except IndexError:
+                        try:
+                            self.sections_dict['SYNOPSIS'] = name_description[0].split('--')[1].strip()
+                        except IndexError:
+                            self.sections_dict['SYNOPSIS'] = 'N/A'
+                else:
+                    self.sections_dict[token[1]] = token[2]
+        return {
+            'command': command,
+            'sections': self.sections_dict,
+            'arguments': self.arguments_dict,
+        }
+
+    def _save_record(self, record):
+        """
+        _save_record(self, record)
+
+        Save a record returned by _process_manpage into the database
+        """
+        command = record['command']
+        self.seen.add(command)
+        if self.corpus is not None:
+            self.corpus.index[command] = record['digest']
+        if record.get('error'):
+            # The command is kept as it was, the next extract tries it again
+            self.results.append(record['error'])
+            return
+        if record.get('unchanged'):
+            self.stats['unchanged'] += 1
+            return
+        previous = self.fingerprints.get(command)
+        self.sections_dict = record['sections']
+        self.arguments_dict = record['arguments']
+        if not self._save_into_db(command, fingerprint=(command, record['fingerprint'], previous is None)):
+            # Man pages without NAME or SYNOPSIS are reported as not saved, not as added
+            return
+        if previous == record['fingerprint']:
+            self.stats['unchanged'] += 1
+        elif previous is None:
+            self.stats['added'] += 1
+        else:
+            self.stats['changed'] += 1
 
     def _run_with_ssh(self):
         """
         _run_with_ssh(self)
 
-        Get commands and arguments remotely
+        Get commands and arguments remotely, every man page is processed as soon as it arrives
         """
-        self._ssh_connect()
-        if not self.ssh_commands_man:
+        self.progress.start('fetch')
+        if _config_flag(self.api_config, 'harvest', settings.CTA_SSH_HARVEST):
+            pages = self._ssh_harvest()
+        else:
+            pages = self._ssh_connect()
+        records = ((command, self._process_manpage(manpage, command)) for (command, manpage) in pages)
+        self._save_records(records)
+        if not self.seen and not self.checkpoint_done and not self.checkpoint_queue:
             raise Exception("There where no commands for extraction")
 
-        for (command, manpage) in self.ssh_commands_man.items():
-            if manpage is None:
-                continue
-            self._parse_sections(manpage, command)
-            for section in ('OPTIONS', 'DESCRIPTION'):
-                self._parse_arguments(section, command)  # TODO. Needs to change for modularity
-            self._save_into_db(command)
-
     def _ssh_connect(self):
         """
-        _ssh_connect(self)
+        _ssh_connect(self) -> generator of (command, man page | None)
 
         Establish connection with remote server running a bash shell.
         Get the commands and respective man pages
         """
-        self.ssh_commands_man = dict()
         command_string = self._ssh_regex()
         hostname = self.api_config.get("host")
         username = self.api_config.get("username")
@@ -250,8 +1574,8 @@ class MExtract:
             ssh_connection.prompt()
             raw_commands = ssh_connection.before
             commands = raw_commands.decode('utf-8')
-            # Get the list of command into python list
-            ssh_list_of_commands = commands.splitlines()
+            # Get the list of command into python list, without the ones of a previous try
+            ssh_list_of_commands = self._start_checkpoint(commands.splitlines)
             for command in ssh_list_of_commands:
                 print("Generating manpage for {}".format(command))
                 get_man = '{0} {1} | cat '.format(settings.CTA_MAN_COMMAND, command)
@@ -266,10 +1590,8 @@ class MExtract:
                 if "No manual" in man:
                     manpage = None
                 else:
-                    # Getting the manpage after apply the regular expression configured
-                    manpage = re.split(self.sections_re, man)
-                # Assigning manpages to a <ssh_commands_man> dictionary using <command> as a key
-                self.ssh_commands_man[command] = manpage
+                    manpage = man
+                yield command, manpage
 
         except pxssh.ExceptionPxssh as e:
             connection = False
@@ -279,21 +1601,194 @@ class MExtract:
 
         ssh_connection.logout()
 
-    def _get_manpage(self, command):
+    def _ssh_harvest(self):
         """
-        _get_manpage(self, command) -> [man_pages_regular_expression_splitted] | None
+        _ssh_harvest(self) -> generator of (command, man page | None)
 
-        Get the man pages for a <command> in a local environment
+        Get the commands and respective man pages running one pipeline in the remote server,
+        so there is just one round trip per host instead of one per command. With a
+        checkpoint the commands are listed first and the ones of a previous try are skipped
+        """
+        command_string = self._ssh_regex()
+        commands = self._start_checkpoint(lambda: self._list_commands(command_string)
+                                          if self.api_config.get('checkpoint') else None)
+        if commands is not None:
+            if not commands:
+                return
+            command_string = "printf '%s\\n' {0}".format(' '.join(shlex.quote(command) for command in commands))
+        for page in self._iter_harvest(command_string):
+            yield page
+
+    def _harvest(self, command_string):
+        """
+        _harvest(self, command_string)
+
+        Store in <ssh_commands_man> the man pages of the commands listed by <command_string>.
+        It does not touch the database, so the hosts of a HostsExtract are harvested in threads
+        """
+        self.ssh_commands_man = dict(self._iter_harvest(command_string))
+
+    def _iter_harvest(self, command_string):
+        """
+        _iter_harvest(self, command_string) -> generator of (command, man page | None)
+
+        Run the harvest pipeline of the commands listed by <command_string>, every man page
+        is preceded by a HARVEST_DELIMITER line and the whole stream is gzipped. The stream
+        is decompressed as it arrives, so just one man page is kept in memory
+        """
+        pipeline = (
+            "{0} | sort -u | while read -r cmd; do "
+            "printf '{1} %s\\n' \"$cmd\"; "
+            "{2} \"$cmd\" </dev/null 2>/dev/null | cat; "
+            "done | gzip -c"
+        ).format(command_string, HARVEST_DELIMITER, settings.CTA_MAN_COMMAND)
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            self._ssh_client_connect(client)
+            stdin, stdout, stderr = client.exec_command(pipeline, timeout=settings.CTA_SSH_HARVEST_TIMEOUT)
+            for (command, man) in self._split_harvest(self._decompress_harvest(stdout)):
+                print("Generating manpage for {}".format(command))
+                if not man.strip() or "No manual" in man:
+                    yield command, None
+                else:
+                    yield command, man
+        except (paramiko.SSHException, OSError) as e:
+            print("ssh harvest failed.")
+            print(e)
+            raise Exception('{0}'.format(e))
+        finally:
+            client.close()
+
+    def _decompress_harvest(self, stream):
+        """
+        _decompress_harvest(self, stream) -> generator of text
+
+        Decompress and decode the gzipped harvest of <stream> in chunks of HARVEST_CHUNK_SIZE
+        """
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            while True:
+                chunk = stream.read(HARVEST_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield decoder.decode(decompressor.decompress(chunk))
+            yield decoder.decode(decompressor.flush(), final=True)
+        except zlib.error as e:
+            raise Exception('Invalid harvest from {0}: {1}'.format(self.api_config.get("host"), e))
+
+    def _ssh_client_connect(self, client):
+        """
+        _ssh_client_connect(self, client)
+
+        Connect a paramiko <client> with the host of <api_config>
+        """
+        client.connect(
+            self.api_config.get("host"),
+            username=self.api_config.get("username"),
+            password=self.api_config.get("password"),
+            port=int(self.api_config.get("port") or 22)
+        )
+
+    def list_remote_commands(self):
+        """
+        list_remote_commands(self) -> list of commands
+
+        Get the sorted commands of the host of <api_config> without their man pages, it is
+        used to split an extract in shards
+        """
+        return self._list_commands(self._ssh_regex())
+
+    def _list_commands(self, command_string):
+        """
+        _list_commands(self, command_string) -> list of commands
+
+        Run <command_string> in the host of <api_config> and get the sorted commands it lists,
+        the commands of a shard were listed before
+        """
+        if self.api_config.get('commands'):
+            return sorted(set(self.api_config['commands']))
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            self._ssh_client_connect(client)
+            stdin, stdout, stderr = client.exec_command("{0} | sort -u".format(command_string),
+                                                        timeout=settings.CTA_SSH_HARVEST_TIMEOUT)
+            commands = stdout.read().decode('utf-8', errors='replace')
+        except (paramiko.SSHException, OSError) as e:
+            print("ssh listing failed.")
+            print(e)
+            raise Exception('{0}'.format(e))
+        finally:
+            client.close()
+        return [command for command in commands.splitlines() if command.strip()]
+
+    def _split_harvest(self, texts):
+        """
+        _split_harvest(self, texts) -> generator of (command, man)
+
+        Split the text of a harvest, that arrives in the pieces of <texts>, in the man page of
+        every command. A man page is yielded as soon as the delimiter of the next one arrives
+        """
+        buffer = ''
+        for text in texts:
+            buffer += text
+            matches = list(HARVEST_DELIMITER_RE.finditer(buffer))
+            if not matches:
+                continue
+            for (match, following) in zip(matches, matches[1:]):
+                command = match.group(1).strip()
+                if command:
+                    yield command, buffer[match.end():following.start()]
+            # Anything written before the first delimiter is dropped
+            buffer = buffer[matches[-1].start():]
+        match = HARVEST_DELIMITER_RE.match(buffer)
+        if match and match.group(1).strip():
+            yield match.group(1).strip(), buffer[match.end():]
+
+    def _get_manpage(self, command):
+        """
+        _get_manpage(self, command) -> man page text | None
 
-        Returns a python list depending of the regular expression configured
+        Get the man pages for a <command> in a local environment, rendered in-process when
+        CTA_MAN_NATIVE_READER is set and with the man command otherwise
         """
+        man_reader = self._get_man_reader()
+        if man_reader is not None:
+            path = man_reader.find(command)
+            if path is None:
+                return None
+            try:
+                man = man_reader.read(path)
+            except Exception as error:
+                print("Error reading {0}: {1}".format(path, error))
+                man = None
+            if man is not None:
+                return man
         try:
             man = subprocess.getoutput("{0} {1}|col -b".format(settings.CTA_MAN_COMMAND, command))
         except: # TODO: add an specific exception type
             man = subprocess.getoutput("{0} {1}".format(settings.CTA_MAN_COMMAND, command.encode('utf-8')))
         if 'No manual' in man:
             return None
-        return re.split(self.sections_re, man)
+        return man
+
+    def _get_man_reader(self):
+        """
+        _get_man_reader(self) -> ManReader object | None
+
+        The reader lists the MANPATH once per process, None when it is disabled or there are
+        no man page sources in the MANPATH
+        """
+        if not getattr(settings, 'CTA_MAN_NATIVE_READER', False):
+            return None
+        if self.man_reader is None:
+            language = re.search(r'-L\s*(\S+)', settings.CTA_MAN_COMMAND)
+            self.man_reader = ManReader(language=language.group(1) if language else None)
+            if not self.man_reader.count():
+                self.man_reader = False
+        return self.man_reader or None
 
     def _parse_sections(self, manpage, command):
         """
@@ -409,44 +1904,28 @@ class MExtract:
             source = None
         return source
 
-    def _save_into_db(self, command_name):
+    def _save_into_db(self, command_name, fingerprint=None):
         """
-        _save_into_db(self, command_name)
+        _save_into_db(self, command_name, fingerprint=None) -> True if the command was queued
 
-        Metod to save the command created and the arguments
+        Metod to queue the command created and the arguments in the bulk writer
         """
-        # TODO: raise exceptions
         try:
-            # Generating command
-            command, created = Command.objects.get_or_create(
-                name=self.sections_dict['NAME'],  ## TODO: Needs to change for modularity
-                description=self.sections_dict['SYNOPSIS'],  ## TODO: Needs to change for modularity
-            )
-            try:
-                command.source.add(self.source)
-            except Exception as error:
-                pass
-                # print(" error in saving OS: {}".format(error))
-            command.save()
-        except Exception as error:
+            name = self.sections_dict['NAME']  ## TODO: Needs to change for modularity
+            description = self.sections_dict['SYNOPSIS']  ## TODO: Needs to change for modularity
+        except KeyError:
             self.results.append("{0} not saved".format(command_name))
-            pass
-            # print(" error in Command DB: {}".format(error))
-
-        try:
-            # Getting all arguments and assigning to the command
-            for key, value in self.arguments_dict.items():
-                args, created = Argument.objects.get_or_create(
-                    command=command,
-                    name=key,
-                    description=value[1],
-                    needs_value=value[0]
-                )
-                args.save()
-
-        except Exception as error:
-            pass
-            print(" error in Argument DB: {}".format(error))
+            return False
+        arguments = []
+        for key, value in self.arguments_dict.items():
+            arguments.append({
+                'name': key,
+                'description': value[1],
+                'needs_value': value[0]
+            })
+        self.writer.add(self.source, name, description, arguments, label=command_name,
+                        fingerprint=fingerprint)
+        return True
 
 
 class PExtract(MExtract):
@@ -455,9 +1934,9 @@ class PExtract(MExtract):
 
     Class created to extract information for man pages, designed to get the parameters of product commands
     """
-    def __init__(self, config, sections_list=None):
+    def __init__(self, config, sections_list=None, progress=None, regex_checked=False):
         """
-        __init__(self, config, sections_list=None)
+        __init__(self, config, sections_list=None, progress=None, regex_checked=False)
 
         Initialization of PExtract:
             config        - Dictionary that have connection data in case user wants to extract
@@ -466,11 +1945,21 @@ class PExtract(MExtract):
                                 "username"
                                 "password"
                                 "port"
+                            and "path", the directory of the commands, "regex", the regular
+                            expression of the arguments, checked with check_regex, and
+                            "page_timeout", the seconds to parse a man page with it
+                            (settings.CTA_REGEX_PAGE_TIMEOUT by default).
                             It will be used as <api_config> in MExtract.__init__ method
             sections_list - list of sections of man pages information
+            progress      - ExtractProgress object to publish the progress of the extract
+            regex_checked - True when the regular expression was checked for the whole extract,
+                            it is just compiled
         """
         arguments_re = None
-        if config.get('host'):
+        if int(config.get('category')) in (6, 7):
+            # Reparse or archive, the commands are taken from the corpus or the archive
+            commands = ''
+        elif config.get('host'):
             commands = "ls {} -p | grep -v /".format(config.get('path'))
         else:
             try:
@@ -480,16 +1969,472 @@ class PExtract(MExtract):
                 return
 
         if config.get('regex'):
-            try:
-                arguments_re = re.compile(config.get('regex'), flags=re.M)
-            except re.error as error:
-                print("Invalid Regular Expression = {}".format(error))
-                return
+            if not regex_checked:
+                check_config_regex(config)
+            arguments_re = re.compile(config.get('regex'), re.M)
 
         self.p_config = (commands, arguments_re)
         self.api_config = config
         MExtract.__init__(self, sections_list=sections_list, p_config=self.p_config,
-                          api_config=self.api_config)
+                          api_config=self.api_config, progress=progress)
+        if arguments_re is not None:
+            # The arguments depend on the regular expression too, a new one parses every page again
+            self.parser_key = '{0}\n{1}'.format(arguments_re.pattern, arguments_re.flags)
+            # A user regular expression can still be too slow with some man page
+            self.page_timeout = float(config.get('page_timeout') or settings.CTA_REGEX_PAGE_TIMEOUT)
+
+
+class HostsExtract:
+    """
+    HostsExtract    -   Extract of several hosts
+
+    Class created to extract the man pages of a list of hosts with the same configuration,
+    the hosts are harvested concurrently and a man page found in several hosts is parsed
+    just once
+    """
+    def __init__(self, config, progress=None):
+        """
+        __init__(self, config, progress=None)
+
+        Initialization of HostsExtract:
+            config   - Dictionary with the configuration of an OS (category 2) or Product
+                       (category 3) extract where the connection data of one host is replaced
+                       by any of:
+                           "hosts"    - list of dictionaries with the keys "host",
+                                        "username", "password" and "port"
+                           "profiles" - list of ids of server profiles
+                       and optionally "concurrency", the number of hosts harvested at the
+                       same time (settings.CTA_EXTRACT_HOST_CONCURRENCY by default)
+            progress - ExtractProgress object to publish the progress of the extract
+        """
+        self.config = config
+        self.progress = progress if progress is not None else ExtractProgress()
+        self.concurrency = int(config.get('concurrency') or settings.CTA_EXTRACT_HOST_CONCURRENCY)
+        self.results = []
+        self.hosts = dict()
+        # Records by (command, fingerprint), shared by the extracts of all the hosts
+        self.parsed = dict()
+        self.pages = 0
+        # Extract that saves the commands of every source, by the id of the source
+        self.owners = dict()
+        self.failed_sources = set()
+
+    def _get_hosts(self):
+        """
+        _get_hosts(self) -> list of dictionaries with the connection data of every host
+
+        Hosts of <config> "hosts" and of the server profiles of <config> "profiles"
+        """
+        hosts = [dict(host) for host in self.config.get('hosts') or []]
+        profiles = self.config.get('profiles') or []
+        if profiles:
+            # Imported here so the extracts do not need the Servers app (e.g. benchmarks)
+            from apps.Servers.models import ServerProfile
+            from apps.Servers.views import get_config_object
+            for profile in ServerProfile.objects.filter(pk__in=profiles):
+                params = get_config_object(json.loads(profile.config or '[]'))
+                host = {
+                    'host': params.get('host'),
+                    'username': params.get('user'),
+                    'password': params.get('passwd'),
+                    'port': params.get('port') or 22
+                }
+                if params.get('path'):
+                    host['path'] = params.get('path')
+                hosts.append(host)
+        return [host for host in hosts if host.get('host')]
+
+    def run(self):
+        """
+        run(self)
+
+        Harvest the man pages of every host in a pool of <concurrency> threads. The threads
+        just wait for the ssh pipelines, the man pages are parsed and saved here as soon as
+        every host is harvested, so the database is used only by this thread
+        """
+        extracts = []
+        for host in self._get_hosts():
+            host_config = dict(self.config, **host)
+            host_config.pop('hosts', None)
+            host_config.pop('profiles', None)
+            host_config.pop('checkpoint', None)
+            # The regular expression was checked by execute_extract
+            extract = _new_extract(host_config, regex_checked=True)
+            try:
+                extracts.append((extract, extract._ssh_regex()))
+            except Exception as error:
+                self._host_failed(extract, error)
+        if not extracts:
+            raise Exception("There where no hosts for extraction")
+
+        self.progress.start('fetch', len(extracts))
+        workers = max(1, min(self.concurrency, len(extracts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(extract._harvest, command_string): extract
+                for (extract, command_string) in extracts
+            }
+            for future in as_completed(futures):
+                extract = futures[future]
+                self.progress.advance()
+                try:
+                    future.result()
+                except Exception as error:
+                    self._host_failed(extract, error)
+                    continue
+                self._save_host(extract)
+
+        self.progress.start('persist')
+        for (source, owner) in self.owners.items():
+            if source in self.failed_sources:
+                # The commands of the failed hosts were not seen, but they can still exist
+                owner.seen.update(owner.fingerprints)
+                self.results.append("Commands of {0} not removed, some hosts failed".format(owner.source))
+            owner._finish()
+
+    def _host_failed(self, extract, error):
+        """
+        _host_failed(self, extract, error)
+
+        Keep the <error> of the host of <extract>
+        """
+        host = extract.api_config.get('host')
+        print(" error in host {0}: {1}".format(host, error))
+        self.results.append("{0} not extracted: {1}".format(host, error))
+        self.hosts[host] = {'error': '{0}'.format(error)}
+        if getattr(extract, 'source', None) is not None and getattr(extract.source, 'pk', None) is not None:
+            self.failed_sources.add(extract.source.pk)
+
+    def _save_host(self, extract):
+        """
+        _save_host(self, extract)
+
+        Parse and save the man pages harvested by <extract>. The hosts of the same source
+        (e.g. the servers of a Product) are saved by the first extract of the source, a
+        command seen in a previous host is not saved again
+        """
+        owner = self.owners.setdefault(extract.source.pk, extract)
+        before = dict(owner.stats)
+        pages = 0
+        for (command, manpage) in extract.ssh_commands_man.items():
+            if manpage is None or command in owner.seen:
+                continue
+            pages += 1
+            record = owner._process_manpage(manpage, command, parsed=self.parsed)
+            if record is not None:
+                owner._save_record(record)
+        # The man pages of the host are not needed anymore
+        extract.ssh_commands_man = dict()
+        self.pages += pages
+        summary = {key: owner.stats[key] - before[key] for key in ('added', 'changed', 'unchanged')}
+        summary['pages'] = pages
+        self.hosts[extract.api_config.get('host')] = summary
+
+    def summary(self):
+        """
+        summary(self) -> dictionary
+
+        Returns the counts of added, changed, unchanged and removed commands of all the hosts,
+        the summary of every host, the man pages processed and the unique man pages parsed
+        """
+        result = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+        errors = list(self.results)
+        for owner in self.owners.values():
+            for key in result:
+                result[key] += owner.stats[key]
+            errors.extend(owner.results)
+        result.update({'errors': errors, 'hosts': self.hosts, 'pages': self.pages, 'parsed': len(self.parsed)})
+        return result
+
+
+# libdoc is the JS variable where the docs are stored, the webpage renders doc tables based on it
+LIBDOC_MARKER = b'libdoc ='
+LIBDOC_CHUNK_SIZE = 64 * 1024
+_json_decoder = json.JSONDecoder()
+
+
+class _LibdocStream:
+    """
+    _LibdocStream
+
+    Text of a libdoc JSON read in chunks from a binary stream, "\\x3c" escapes of the
+    page are replaced by "<"
+    """
+    def __init__(self, stream, data):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.buffer = ''
+        self.position = 0
+        self.hold = ''
+        self.finished = False
+        self._append(data)
+
+    def _append(self, data, final=False):
+        text = self.hold + self.decoder.decode(data, final)
+        self.hold = ''
+        if not final:
+            # An escape can be split between two chunks
+            cut = text.rfind('\\', max(0, len(text) - 3))
+            if cut != -1:
+                self.hold = text[cut:]
+                text = text[:cut]
+        self.buffer = self.buffer[self.position:] + text.replace('\\x3c', '<')
+        self.position = 0
+
+    def fill(self):
+        """
+        fill(self) -> True | False
+
+        Read one more chunk, False at the end of the stream
+        """
+        if self.finished:
+            return False
+        data = self.stream.read(LIBDOC_CHUNK_SIZE)
+        self.finished = not data
+        self._append(data, final=self.finished)
+        return True
+
+    def skip(self, characters=' \t\r\n'):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in characters:
+                self.position += 1
+            if self.position < len(self.buffer) or not self.fill():
+                return
+
+    def expect(self, character):
+        self.skip()
+        if self.buffer[self.position:self.position + 1] != character:
+            raise ValueError("libdoc: {0} expected at {1!r}".format(
+                character, self.buffer[self.position:self.position + 20]))
+        self.position += 1
+
+    def peek(self):
+        self.skip()
+        return self.buffer[self.position:self.position + 1]
+
+    def value(self):
+        """
+        value(self) -> next JSON value of the stream
+        """
+        self.skip()
+        while True:
+            try:
+                result, end = _json_decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+            # A number or a literal can continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.position = end
+            return result
+
+
+def read_libdoc(stream):
+    """
+    read_libdoc(stream) -> generator of keyword dictionaries | None
+
+    Find the libdoc JSON of a Robot Framework library page with a streaming scan of a binary
+    <stream> and decode its keywords one at a time, so just one chunk of the page and one
+    keyword are kept in memory. Returns None when the page has no libdoc
+    """
+    tail = b''
+    while True:
+        chunk = stream.read(LIBDOC_CHUNK_SIZE)
+        if not chunk:
+            return None
+        data = tail + chunk
+        found = data.find(LIBDOC_MARKER)
+        if found != -1:
+            break
+        tail = data[-len(LIBDOC_MARKER):]
+    text = _LibdocStream(stream, data[found + len(LIBDOC_MARKER):])
+    return _iter_keywords(text)
+
+
+def _iter_keywords(text):
+    text.expect('{')
+    while text.peek() != '}':
+        key = text.value()
+        text.expect(':')
+        if key != 'keywords':
+            # The rest of the library attributes are not used
+            text.value()
+        else:
+            text.expect('[')
+            while text.peek() != ']':
+                yield text.value()
+                if text.peek() == ',':
+                    text.expect(',')
+            text.expect(']')
+        if text.peek() == ',':
+            text.expect(',')
+    text.expect('}')
+
+
+def _open_library(lib):
+    """
+    _open_library(lib) -> binary file object
+
+    Open the page of a library from the zip or the url
+    """
+    if 'path' in lib:
+        robot_zip = zipfile.ZipFile(lib['zip'])
+        try:
+            return robot_zip.open(lib['path'])
+        finally:
+            # The member keeps the file open until it is closed
+            robot_zip.close()
+    req = urllib.request.Request(lib['url'])
+    return urllib.request.urlopen(req)
+
+
+def read_libdoc_spec(stream):
+    """
+    read_libdoc_spec(stream) -> generator of keyword dictionaries
+
+    Decode the keywords of a libdoc spec, the XML or JSON written by "libdoc Library
+    Library.xml", read as a stream from a binary <stream>. The keywords have the keys of the
+    libdoc of a library page: "name", "args" (like "name=default"), "doc", "shortdoc" and "tags"
+    """
+    head = stream.read(LIBDOC_CHUNK_SIZE)
+    if head.lstrip()[:1] == b'{':
+        keywords = _iter_keywords(_LibdocStream(stream, head))
+        return (_spec_keyword(keyword['name'], keyword.get('args', []), keyword.get('doc', ''),
+                              keyword.get('shortdoc'), keyword.get('tags', []))
+                for keyword in keywords)
+    return _iter_xml_keywords(itertools.chain([head], iter(lambda: stream.read(LIBDOC_CHUNK_SIZE), b'')))
+
+
+def _iter_xml_keywords(chunks):
+    """
+    _iter_xml_keywords(chunks) -> generator of keyword dictionaries
+
+    Keywords of a libdoc XML spec, "kw" elements of Robot Framework 3 and "keyword" ones of
+    Robot Framework 4 or newer. Every keyword is dropped once it is decoded
+    """
+    parser = ElementTree.XMLPullParser(events=('end',))
+    for chunk in chunks:
+        parser.feed(chunk)
+        for (event, element) in parser.read_events():
+            if element.tag not in ('kw', 'keyword'):
+                continue
+            arguments = []
+            for arg in element.iterfind('arguments/arg'):
+                if arg.find('name') is None:
+                    arguments.append(arg.text or '')
+                else:
+                    arguments.append({'name': arg.findtext('name'), 'defaultValue': arg.findtext('default'),
+                                      'kind': arg.get('kind')})
+            tags = [tag.text for tag in element.iterfind('tags/tag')]
+            yield _spec_keyword(element.get('name'), arguments, element.findtext('doc') or '',
+                                element.findtext('shortdoc'), tags)
+            element.clear()
+    parser.close()
+
+
+def _spec_keyword(name, args, doc, shortdoc=None, tags=()):
+    """
+    _spec_keyword(name, args, doc, shortdoc=None, tags=()) -> keyword dictionary
+
+    Keyword of a libdoc spec or an imported library with the arguments as strings, the
+    arguments of Robot Framework 4 or newer are dictionaries or objects with their name,
+    default value and kind
+    """
+    arguments = []
+    for arg in args:
+        if isinstance(arg, str):
+            arguments.append(arg)
+            continue
+        if not isinstance(arg, dict):
+            arg = {'name': arg.name, 'defaultValue': getattr(arg, 'default_repr', None), 'kind': arg.kind}
+        kind = arg.get('kind')
+        if kind == 'NAMED_ONLY_MARKER':
+            continue
+        prefix = {'VAR_POSITIONAL': '*', 'VAR_NAMED': '**'}.get(kind, '')
+        default = arg.get('defaultValue')
+        arguments.append(prefix + arg['name'] + ('={0}'.format(default) if default is not None else ''))
+    if shortdoc is None:
+        # The first paragraph of the documentation, as libdoc does
+        shortdoc = ' '.join(itertools.takewhile(lambda line: line.strip(), doc.strip().splitlines()))
+    return {'name': name, 'args': arguments, 'doc': doc, 'shortdoc': shortdoc, 'tags': list(tags)}
+
+
+def import_library_keywords(name):
+    """
+    import_library_keywords(name) -> list of keyword dictionaries
+
+    Keywords of the library <name> importable in the worker environment, documented by the
+    libdoc of Robot Framework
+    """
+    try:
+        from robot.libdoc import LibraryDocumentation
+    except ImportError:
+        raise Exception("Robot Framework is not installed in the worker, {0} can not be imported".format(name))
+    library = LibraryDocumentation(name)
+    return [_spec_keyword(keyword.name, keyword.args, keyword.doc, keyword.shortdoc, keyword.tags)
+            for keyword in library.keywords]
+
+
+def keyword_record(keyword):
+    """
+    keyword_record(keyword) -> (name, shortdoc, arguments, digest)
+
+    Plain record of a libdoc <keyword> with the arguments as they are saved
+    """
+    # The libdoc entry of the keyword is its fingerprint
+    digest = _digest(json.dumps(keyword, sort_keys=True))
+    arguments = []
+    for arg in keyword['args']:
+        is_required = True
+        if "=" in arg:
+            is_required = False
+        arg_split = arg.split('=')
+        arguments.append({
+            'name': arg_split[0],
+            'description': keyword['name'],
+            'requirement': is_required,
+            'needs_value': True
+        })
+    return (keyword['name'], keyword['shortdoc'], arguments, digest)
+
+
+def parse_library(lib):
+    """
+    parse_library(lib) -> dictionary
+
+    Parses a Robot library from a json formated string, format is expected to be like the
+    Robot Framework 3.0 page, from a libdoc spec ("spec" key of <lib>) or from the library
+    imported in the worker ("library" key). It does not use the database, so it can run in
+    a pool worker
+
+    Returns a plain record with the keys "name", "keywords" - list of (name, shortdoc,
+    arguments, digest) - and "error", None when the library was parsed
+    """
+    print("Running parser for {}".format(lib['name']))
+    record = {'name': lib['name'], 'keywords': [], 'error': None}
+    try:
+        if 'library' in lib:
+            for keyword in import_library_keywords(lib['library']):
+                record['keywords'].append(keyword_record(keyword))
+            return record
+        if 'spec' in lib:
+            with open(lib['spec'], 'rb') as spec:
+                for keyword in read_libdoc_spec(spec):
+                    record['keywords'].append(keyword_record(keyword))
+            return record
+        with _open_library(lib) as page:
+            keywords = read_libdoc(page)
+            if keywords is None:
+                record['error'] = "libdoc not found"
+                return record
+            for keyword in keywords:
+                record['keywords'].append(keyword_record(keyword))
+    except Exception as error:
+        record['keywords'] = []
+        record['error'] = str(error) or error.__class__.__name__
+    return record
 
 
 class RExtract():
@@ -498,9 +2443,9 @@ class RExtract():
 
     Class created to extract information from Robot Framework documentations
     """
-    def __init__(self, config):
+    def __init__(self, config, progress=None):
         """ 
-        __init__(self, config)
+        __init__(self, config, progress=None)
 
         Initialization of RExtract:
             config - Dictionary that have the information of where to get Robot
@@ -510,105 +2455,160 @@ class RExtract():
                                     or 5 that means External Libraries
                          "zip" - zipfile path
                          "url"
+                         "spec" - path of a libdoc XML or JSON spec, instead of "url"
+                         "library" - name of a library importable in the worker,
+                                     instead of "url"
+                         "batch_size" - number of keywords saved per transaction
+                         "force" - parse again the keywords that did not change
+                         "workers" - processes used to parse the libraries
+            progress - ExtractProgress object to publish the progress of the extract
         """
         robot_version = Source.objects.get(id=config.get("source"))
         self.r_version = robot_version
+        self.results = []
+        self.writer = BulkWriter(batch_size=config.get('batch_size'), results=self.results)
+        self.force = _config_flag(config, 'force')
+        self.stats = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+        self.progress = progress if progress is not None else ExtractProgress()
         self.libraries = list()
         self.extra_libraries = list()
         self.source_dict = dict()
         _category = int(config.get('category'))
-        if _category is 4:
-            self.zip = zipfile.ZipFile(config.get("zip"))
-            for path in self.zip.namelist():
-                if re.search(r'/libraries/', path):
+        self.workers = int(config.get('workers') or settings.CTA_EXTRACT_WORKERS)
+        # Libraries are opened one at a time when they are parsed
+        if _category == 4:
+            self.zip = config.get("zip")
+            with zipfile.ZipFile(self.zip) as robot_zip:
+                paths = robot_zip.namelist()
+            for path in paths:
+                if re.search(r'/libraries/', path) and not path.endswith('/'):
                     name = path.split('/')[-1].split('.')[0]
                     self.libraries.append({
                         'name': name,
-                        'lib_page': self.zip.open(path).readlines()
+                        'zip': self.zip,
+                        'path': path
                     })
-                    source, created = Source.objects.get_or_create(
-                        name=name,
-                        version=self.r_version.version,
-                        category=5,
-                    )
-                    instance = source
-                    instance.depends.add(self.r_version)
-                    instance.save()
-                    self.source_dict[name] = instance
-        elif _category is 5:
+        elif _category == 5 and config.get("library"):
+            # "Collections", "SeleniumLibrary" or "path/to/MyLibrary.py"
+            name = os.path.splitext(os.path.basename(config.get("library")))[0]
+            self.libraries.append({
+                'name': name,
+                'library': config.get("library")
+            })
+            self.source_dict[name] = robot_version
+        elif _category == 5 and config.get("spec"):
+            name = os.path.basename(config.get("spec")).split('.')[0]
+            self.libraries.append({
+                'name': name,
+                'spec': config.get("spec")
+            })
+            self.source_dict[name] = robot_version
+        elif _category == 5:
             self.lib_url = config.get("url")
-            req = urllib.request.Request(self.lib_url)
-            res = urllib.request.urlopen(req)
             name = self.lib_url.split('/')[-1].split('.')[0]
             self.libraries.append({
                 'name': name,
-                'lib_page': res.readlines()
+                'url': self.lib_url
             })
             self.source_dict[name] = robot_version
 
+    def _get_library_source(self, name):
+        """
+        _get_library_source(self, name) -> Source object
 
+        Sources of the libraries of a Robot Framework zip are created when they are parsed
+        """
+        if name not in self.source_dict:
+            source, created = Source.objects.get_or_create(
+                name=name,
+                version=self.r_version.version,
+                category=5,
+            )
+            instance = source
+            instance.depends.add(self.r_version)
+            instance.save()
+            self.source_dict[name] = instance
+        return self.source_dict[name]
 
-    def _lib_parser(self, lib):
+    def _save_library(self, record):
         """
-        _lib_parser(self, lib) -> True | False
+        _save_library(self, record)
 
-        Parses a Robot library from a json formated string
-        format is expected to be like the Robot Framework 3.0 page
+        Queue in the bulk writer the keywords of a parsed library that changed since the
+        last extract and remove the ones that are not in the library anymore
         """
-        lib_name = lib['name']
-        libdoc = False
-        for x in lib['lib_page']:
-            # libdoc is the JS variable where the docs are stored.
-            # webpage renders doc tables based on this json
-            line = x.decode('utf-8')
-            if re.search(r'libdoc =', line):
-                libdoc = True
-                line = re.sub(r'\\x3c', '<', line)
-                line = re.sub(r';', '', line)
-                #print(line.split('=', 1)[1])
-                lib_dict = json.loads(line.split('=', 1)[1])
-                for keyword in lib_dict['keywords']:
-                    try:
-                        rbt_keyw, created = Command.objects.get_or_create(
-                            name=keyword['name'],
-                            description=keyword['shortdoc']
-                        )
-                        rbt_keyw.source.add(self.source_dict[lib_name])
-                        rbt_keyw.save()
-                    except Exception as error:
-                        print(error)
-                    for arg in keyword['args']:
-                        is_required = True
-                        if "=" in arg:
-                            is_required = False
-                        arg_split = arg.split('=')
-                        arg_name = arg_split[0]
-                        try:
-                            keyw_opt, created = Argument.objects.get_or_create(
-                                command = rbt_keyw,
-                                name=arg_name,
-                                description=rbt_keyw,
-                                requirement=is_required,
-                                needs_value=True
-                            )
-                            rbt_keyw.save()
-                        except Exception as error:
-                            print(error)
-        # endfor
-        return libdoc
+        source = self._get_library_source(record['name'])
+        fingerprints = _load_fingerprints(source)
+        seen = set()
+        for (name, shortdoc, arguments, digest) in record['keywords']:
+            previous = fingerprints.get(name)
+            seen.add(name)
+            if previous == digest:
+                self.stats['unchanged'] += 1
+                if not self.force:
+                    continue
+            elif previous is None:
+                self.stats['added'] += 1
+            else:
+                self.stats['changed'] += 1
+            self.writer.add(source, name, shortdoc, arguments, fingerprint=(name, digest, previous is None))
+        self.writer.flush()
+        removed = set(fingerprints).difference(seen)
+        _remove_fingerprints(source, removed)
+        self.stats['removed'] += len(removed)
+
+    def _parse_libraries(self):
+        """
+        _parse_libraries(self) -> generator of library records
+
+        Fan out the parse of the libraries into a pool of <self.workers> processes, records
+        are yielded in the order they are finished
+        """
+        workers = min(self.workers, len(self.libraries))
+        if workers <= 1:
+            yield from map(parse_library, self.libraries)
+            return
+        # Forked workers must not share the parent database connection
+        connections.close_all()
+        pool = Pool(workers)
+        try:
+            for record in pool.imap_unordered(parse_library, self.libraries):
+                yield record
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
 
     def run_r_extract(self):
         """
         run_r_extract(self) -> True | False
 
-        Runs R Extract with loaded libraries
+        Runs R Extract with loaded libraries, the libraries that can not be parsed are
+        reported in the results and the rest of them are saved anyway
+
+        Returns True when all the libraries were added
         """
-        for lib in self.libraries:
-            print("Running parser for {}".format(lib['name']))
-            result = self._lib_parser(lib)
-            if result:
-                print("Library {} added".format(lib['name']))
+        parsed = True
+        self.progress.start('parse', len(self.libraries))
+        for record in self._parse_libraries():
+            self.progress.advance()
+            if record['error'] is not None:
+                print("Library {0} not added: {1}".format(record['name'], record['error']))
+                self.results.append("{0} not parsed: {1}".format(record['name'], record['error']))
+                parsed = False
                 continue
-            else:
-                return False
-        return True
+            self._save_library(record)
+            print("Library {} added".format(record['name']))
+        self.progress.start('persist')
+        self.writer.flush()
+        return parsed
+
+    def summary(self):
+        """
+        summary(self) -> dictionary
+
+        Returns the counts of added, changed, unchanged and removed keywords and the errors
+        """
+        result = dict(self.stats)
+        result['errors'] = self.results
+        return result
@@ -6,13 +6,8 @@
 # |                  by Francisco Suárez                   |
 # | - - - - - - - - - - - - - - - - - - - - - - - - - - -  |
 DIRS_SCHEMA=(
-    "test_keywords"
     "zip"
     "test_result"
-    "test_cases"
-    "test_suites"
-    "keywords"
-    "profiles"
     )
 echo "Checking the media schema"
 for i in "${DIRS_SCHEMA[@]}"